@@ -1,63 +1,57 @@
-from flask import Flask, render_template, jsonify, request
-from routes import book, member, transaction
-import json
-import os
+"""Application factory.
 
-CONFIG_FILE = "rent.json"
+create_app() builds the app without touching the database: connections are
+opened per request from each worker's own pool, so the app can be created
+once in a gunicorn master and forked (``--preload``). PDF rendering
+(WeasyPrint) and outbound HTTP (requests) are imported on first use.
 
+Usage:
+    flask run
+    gunicorn --preload --workers 4 "app:create_app()"
+"""
+from flask import Flask
+from routes import book, main, member, transaction
+from config.config import db
+import assets
+import metrics
 
-app = Flask(__name__)
 
-# Register blueprints
-app.register_blueprint(book.bp)
-app.register_blueprint(member.bp)
-app.register_blueprint(transaction.bp)
+def create_app():
+    app = Flask(__name__)
+    metrics.init_app(app)  # First, so request timings include waiting for a pooled connection
+    assets.init_app(app)
 
-@app.route('/')
-def home():
-    return render_template("home.html")
+    # Register blueprints
+    app.register_blueprint(main.bp)
+    app.register_blueprint(book.bp)
+    app.register_blueprint(member.bp)
+    app.register_blueprint(transaction.bp)
 
- 
-@app.route('/update-rent', methods=['POST'])
-def update_rent():
-    try:
-        # Get the new rent amount from the form data
-        new_rent = int(request.form['rent_amount'])
+    # Check a connection out of the pool for each request and hand it back afterwards
+    @app.before_request
+    def open_db_connection():
+        db.connect(reuse_if_open=True)
 
-        # Read the existing configuration from the JSON file
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
+    @app.teardown_request
+    def close_db_connection(exc):
+        if not db.is_closed():
+            db.close()
 
-        # Update the rent amount in the config
-        config["rent_amount"] = new_rent
+    return app
 
-        # Write the updated configuration back to the JSON file
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f)
 
-        return jsonify({"success": True, "message": f"Rent updated to ₹{new_rent}"}), 200
+_app = None
 
-    except Exception as e:
-        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
-
-
-
-@app.route('/settings', methods=['GET'])
-def settings():
-    try:
-        # Read the current rent from the config file
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
-
-        # Get the current rent amount, default to 40 if not set
-        current_rent = config.get("rent_amount", 40)
-
-        return render_template('settings.html', current_rent=current_rent)
-
-    except Exception as e:
-        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
 
+def __getattr__(name):
+    # Keeps ``gunicorn app:app`` and ``from app import app`` working; the app is created on first access
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
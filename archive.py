@@ -0,0 +1,83 @@
+"""Moves settled loans out of the working transaction table.
+
+The issue/return desk, the ARN worker and the fine job only touch open and
+recently returned loans, yet every loan ever made used to stay in
+``transaction``, so its indexes and the transaction list grew with the
+library's history. This job moves loans returned more than
+ARCHIVE_AFTER_DAYS ago whose invoice id has been issued
+(``arn_status='done'``) to ``transaction_archive`` (migration 010),
+ARCHIVE_BATCH_SIZE rows per database transaction. Rows are claimed with
+``FOR UPDATE SKIP LOCKED``, so the job never waits on the desk, and keep
+their ids.
+
+Archived loans are listed with ``/transaction/list?status=archived``,
+included in the CSV export and can still be printed as receipts. A migration
+that adds a column to ``transaction`` must add it to ``transaction_archive``
+as well.
+
+Usage:
+    python archive.py              # archive every ARCHIVE_INTERVAL_SECONDS
+    python archive.py --once       # archive what is due and exit (e.g. from cron)
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from cache import invalidate
+from config.config import db
+from models import Transaction
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 180))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 10_000))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", 3600))
+
+# Both tables have the same columns, though not necessarily in the same order
+COLUMNS = ", ".join(f'"{field.column_name}"' for field in Transaction._meta.sorted_fields)
+
+
+def archive_batch(cutoff: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to batch_size settled loans returned before cutoff. Returns the number moved."""
+    with db.atomic():
+        # Moved rows are not deletes to sync clients (see migration 010)
+        db.execute_sql("SET LOCAL lms.skip_tombstones = 'on'")
+        cursor = db.execute_sql(f"""
+            WITH moved AS (
+                DELETE FROM "transaction" WHERE id IN (
+                    SELECT id FROM "transaction"
+                    WHERE status = 'returned' AND return_date < %s AND arn_status = 'done'
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED)
+                RETURNING {COLUMNS})
+            INSERT INTO transaction_archive ({COLUMNS}) SELECT {COLUMNS} FROM moved""", (cutoff, batch_size))
+        return cursor.rowcount
+
+
+def archive_returned(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive every loan settled more than days ago. Returns the number of loans moved."""
+    cutoff = date.today() - timedelta(days=days)
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            break
+    if total:
+        invalidate("transaction")
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Archive once and exit")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="Archive loans returned this long ago")
+    parser.add_argument("--every", type=int, default=ARCHIVE_INTERVAL_SECONDS, help="Seconds between runs")
+    args = parser.parse_args()
+
+    while True:
+        started = time.perf_counter()
+        with db.connection_context():
+            moved = archive_returned(args.days)
+        print(f"Archived {moved} loan(s) in {time.perf_counter() - started:.2f}s")
+        if args.once:
+            break
+        time.sleep(args.every)
@@ -0,0 +1,138 @@
+"""Background worker that drains the ARN (e-invoice id) queue.
+
+Every transaction starts with ``arn_status='pending'``. The worker claims a
+batch of due rows with ``FOR UPDATE SKIP LOCKED`` (so several workers can run
+side by side), marks them ``in_flight`` under a lease, requests ARNs through a
+bounded thread pool sharing one pooled HTTP session, and records the outcome:
+``done`` on success, back to ``pending`` with exponential backoff on failure,
+``failed`` once ``ARN_MAX_ATTEMPTS`` is reached. Rows left ``in_flight`` by a
+crashed worker become claimable again when their lease expires.
+
+Usage:
+    python arn_worker.py                 # poll forever
+    python arn_worker.py --once          # drain what is due and exit
+    python arn_worker.py --retry-failed  # re-queue failed rows first
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from peewee import IntegrityError
+from config.config import db
+from models import Transaction, Member
+from books_api import generate_arn, get_session
+from cache import invalidate
+
+ARN_MAX_ATTEMPTS = int(os.getenv("ARN_MAX_ATTEMPTS", 5))
+ARN_BACKOFF_SECONDS = int(os.getenv("ARN_BACKOFF_SECONDS", 30))
+ARN_LEASE_SECONDS = int(os.getenv("ARN_LEASE_SECONDS", 300))
+ARN_BATCH_SIZE = int(os.getenv("ARN_BATCH_SIZE", 50))
+ARN_WORKERS = int(os.getenv("ARN_WORKERS", 4))
+ARN_POLL_INTERVAL = float(os.getenv("ARN_POLL_INTERVAL", 5))
+
+
+def claim_batch(batch_size=ARN_BATCH_SIZE):
+    """Lease up to batch_size due transactions and return them with member names loaded."""
+    now = datetime.now()
+    with db.atomic():
+        due = (Transaction
+               .select(Transaction.id)
+               .where(Transaction.invoice_id.is_null() &
+                      Transaction.arn_status.in_(['pending', 'in_flight']) &
+                      (Transaction.arn_next_attempt <= now))
+               .order_by(Transaction.arn_next_attempt)
+               .limit(batch_size)
+               .for_update(skip_locked=True))
+        claimed = [row.id for row in (Transaction
+                   .update(arn_status='in_flight',
+                           arn_attempts=Transaction.arn_attempts + 1,
+                           arn_next_attempt=now + timedelta(seconds=ARN_LEASE_SECONDS))
+                   .where(Transaction.id.in_(due))
+                   .returning(Transaction.id)
+                   .execute())]
+
+    if not claimed:
+        return []
+
+    return list(Transaction
+                .select(Transaction.id, Transaction.rent_fee, Transaction.arn_attempts, Member.first_name)
+                .join(Member)
+                .where(Transaction.id.in_(claimed)))
+
+
+def record_result(transaction, arn):
+    """Store the outcome of one ARN request and schedule a retry if needed."""
+    if arn:
+        try:
+            (Transaction
+             .update(invoice_id=arn, arn_status='done')
+             .where(Transaction.id == transaction.id)
+             .execute())
+            return True
+        except IntegrityError:
+            pass  # Duplicate ARN from the API; treat as a failed attempt
+
+    if transaction.arn_attempts >= ARN_MAX_ATTEMPTS:
+        status, next_attempt = 'failed', datetime.now()
+    else:
+        delay = ARN_BACKOFF_SECONDS * 2 ** (transaction.arn_attempts - 1)
+        status, next_attempt = 'pending', datetime.now() + timedelta(seconds=delay)
+
+    (Transaction
+     .update(arn_status=status, arn_next_attempt=next_attempt)
+     .where(Transaction.id == transaction.id)
+     .execute())
+    return False
+
+
+def drain_once(batch_size=ARN_BATCH_SIZE, workers=ARN_WORKERS):
+    """Process one claimed batch. Returns (claimed, succeeded)."""
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    session = get_session()
+    succeeded = 0
+    # HTTP calls run in the pool; DB writes stay on this thread's connection.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate_arn, txn, session): txn for txn in batch}
+        for future in as_completed(futures):
+            if record_result(futures[future], future.result()):
+                succeeded += 1
+
+    invalidate("transaction")  # Cached transaction lists show invoice ids
+    return len(batch), succeeded
+
+
+def retry_failed():
+    """Move permanently failed rows back to the queue with a fresh attempt budget."""
+    return (Transaction
+            .update(arn_status='pending', arn_attempts=0, arn_next_attempt=datetime.now())
+            .where(Transaction.invoice_id.is_null() & (Transaction.arn_status == 'failed'))
+            .execute())
+
+
+def run(batch_size=ARN_BATCH_SIZE, workers=ARN_WORKERS, poll_interval=ARN_POLL_INTERVAL, once=False):
+    while True:
+        claimed, succeeded = drain_once(batch_size, workers)
+        if claimed:
+            print(f"ARN worker: {succeeded}/{claimed} invoices issued")
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drain the ARN invoice queue.")
+    parser.add_argument("--once", action="store_true", help="Exit when no due rows remain")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-queue failed rows before starting")
+    parser.add_argument("--batch-size", type=int, default=ARN_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=ARN_WORKERS)
+    parser.add_argument("--poll-interval", type=float, default=ARN_POLL_INTERVAL)
+    args = parser.parse_args()
+
+    if args.retry_failed:
+        print(f"Re-queued {retry_failed()} failed transactions")
+    run(args.batch_size, args.workers, args.poll_interval, args.once)
@@ -0,0 +1,213 @@
+"""Fingerprinted, resized static assets.
+
+The images under static/ are the full-size originals (up to a few MB each).
+The build writes, for every image, AVIF and WebP variants at each of
+ASSET_WIDTHS (never wider than the original) plus a re-encoded fallback in a
+format every browser reads, and a gzipped copy of every text asset (SVG, CSS,
+JS). Each output is named after the hash of its content, so ``/assets/<name>``
+is served with an immutable year-long cache lifetime and a changed image gets
+a new URL. ``manifest.json`` in ASSET_DIR maps source names to their outputs.
+
+Templates link assets with the same arguments as url_for():
+
+    {{ asset_url('static', filename='books.jpg') }}                 # largest fallback
+    {{ asset_url('static', filename='books.jpg', format='webp', width=640) }}
+    {{ asset_srcset('books.jpg', 'avif') }}                        # for <source srcset>
+
+Files that are not in the manifest fall back to the plain /static URL.
+
+The build is a deploy step: it is incremental (sources are matched on size
+and mtime), but a full build takes about half a minute, so the app never runs
+it. Workers only read the manifest, and until one exists pages link the
+/static originals.
+
+Usage:
+    python assets.py            # build what changed
+    python assets.py --force    # rebuild everything
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import tempfile
+from flask import request, send_from_directory, url_for
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+ASSET_DIR = os.getenv("ASSET_DIR", os.path.join(BASE_DIR, "instance", "assets"))
+ASSET_WIDTHS = (480, 960, 1920)
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+IMAGE_TYPES = {".jpg", ".jpeg", ".png", ".avif", ".webp"}
+TEXT_TYPES = {".svg", ".css", ".js", ".json", ".txt"}
+QUALITY = {"avif": 55, "webp": 78, "jpeg": 80}
+SUFFIX = {"avif": ".avif", "webp": ".webp", "jpeg": ".jpg", "png": ".png"}
+
+_manifest = None
+
+
+def _atomic_write(path, data):
+    # Workers starting together may build the same file; each replaces it whole
+    fd, tmp_path = tempfile.mkstemp(dir=ASSET_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def _write(data, stem, suffix):
+    """Store data under a content-hashed name in ASSET_DIR and return the name."""
+    name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{suffix}"
+    path = os.path.join(ASSET_DIR, name)
+    if not os.path.exists(path):
+        _atomic_write(path, data)
+    return name
+
+
+def _encode(image, fmt):
+    # Encoder settings trade a few percent of size for a build that is several times faster
+    out = io.BytesIO()
+    if fmt == "avif":
+        image.save(out, "AVIF", quality=QUALITY[fmt], speed=8)
+    elif fmt == "webp":
+        image.save(out, "WEBP", quality=QUALITY[fmt], method=4)
+    elif fmt == "jpeg":
+        image.save(out, "JPEG", quality=QUALITY[fmt], optimize=True, progressive=True)
+    else:
+        image.save(out, "PNG")
+    return out.getvalue()
+
+
+def build_image(filename):
+    from PIL import Image, features
+    stem = os.path.splitext(filename)[0]
+    with Image.open(os.path.join(STATIC_DIR, filename)) as original:
+        has_alpha = "A" in original.getbands() or "transparency" in original.info
+        original = original.convert("RGBA" if has_alpha else "RGB")
+        width, height = original.size
+        # PNG keeps transparency; everything else falls back to JPEG
+        formats = ["webp", "png" if has_alpha else "jpeg"]
+        if features.check("avif"):
+            formats.insert(0, "avif")
+
+        variants = {fmt: [] for fmt in formats}
+        for target in sorted({min(w, width) for w in ASSET_WIDTHS}):
+            image = original if target == width else original.resize(
+                (target, round(height * target / width)), Image.LANCZOS)
+            for fmt in formats:
+                variants[fmt].append([target, _write(_encode(image, fmt), f"{stem}-{target}", SUFFIX[fmt])])
+    return {"width": width, "height": height, "fallback": formats[-1], "variants": variants}
+
+
+def build_text(filename):
+    stem, suffix = os.path.splitext(filename)
+    with open(os.path.join(STATIC_DIR, filename), "rb") as f:
+        data = f.read()
+    name = _write(data, stem, suffix)
+    gz_path = os.path.join(ASSET_DIR, name + ".gz")
+    if not os.path.exists(gz_path):
+        # mtime=0 keeps the compressed bytes identical between builds
+        _atomic_write(gz_path, gzip.compress(data, 9, mtime=0))
+    return {"file": name}
+
+
+def build(force=False):
+    """Bring ASSET_DIR up to date with static/. Returns the number of sources (re)built."""
+    global _manifest
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    previous = {} if force else load_manifest()
+    entries, built = {}, 0
+    for filename in sorted(os.listdir(STATIC_DIR)):
+        suffix = os.path.splitext(filename)[1].lower()
+        if suffix not in IMAGE_TYPES and suffix not in TEXT_TYPES:
+            continue
+        stat = os.stat(os.path.join(STATIC_DIR, filename))
+        source = [stat.st_size, stat.st_mtime_ns]
+        entry = previous.get(filename)
+        if entry is None or entry["source"] != source:
+            entry = build_image(filename) if suffix in IMAGE_TYPES else build_text(filename)
+            entry["source"] = source
+            built += 1
+        entries[filename] = entry
+
+    if entries != previous:
+        _atomic_write(os.path.join(ASSET_DIR, "manifest.json"), json.dumps(entries, indent=1, sort_keys=True).encode())
+    _manifest = entries
+    return built
+
+
+def load_manifest():
+    try:
+        with open(os.path.join(ASSET_DIR, "manifest.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def manifest():
+    global _manifest
+    # Read again while empty: workers started before the first build pick it up from disk
+    if not _manifest:
+        _manifest = load_manifest()
+    return _manifest
+
+
+def asset_url(endpoint, **values):
+    """url_for() that sends static files to their fingerprinted build outputs.
+
+    For images, format picks avif, webp or the fallback (default) and width the
+    smallest variant at least that wide (default: the largest).
+    """
+    fmt = values.pop("format", None)
+    width = values.pop("width", None)
+    entry = manifest().get(values.get("filename")) if endpoint == 'static' else None
+    if entry is None:
+        return url_for(endpoint, **values)
+    if "file" in entry:
+        return url_for('asset', name=entry["file"])
+
+    variants = entry["variants"].get(fmt or entry["fallback"]) or entry["variants"][entry["fallback"]]
+    name = variants[-1][1]
+    if width:
+        name = next((n for w, n in variants if w >= width), name)
+    return url_for('asset', name=name)
+
+
+def asset_srcset(filename, fmt):
+    """srcset value listing every width of one format, or "" if there is none."""
+    entry = manifest().get(filename)
+    if entry is None or fmt not in entry.get("variants", {}):
+        return ""
+    return ", ".join(f"{url_for('asset', name=name)} {w}w" for w, name in entry["variants"][fmt])
+
+
+def serve(name):
+    gz_path = os.path.join(ASSET_DIR, name + ".gz")
+    if 'gzip' in request.accept_encodings and os.path.exists(gz_path):
+        response = send_from_directory(ASSET_DIR, name + ".gz", max_age=ASSET_MAX_AGE)
+        response.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+    else:
+        response = send_from_directory(ASSET_DIR, name, max_age=ASSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """Serve /assets/<name> and expose the template helpers; the build itself is ``python assets.py``."""
+    app.add_url_rule('/assets/<name>', 'asset', serve)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="Rebuild every source, not just the changed ones")
+    args = parser.parse_args()
+
+    built = build(args.force)
+    print(f"Assets: {built} source(s) built, manifest in {os.path.join(ASSET_DIR, 'manifest.json')}")
@@ -0,0 +1,198 @@
+"""Transaction list and return latency as the loan history grows.
+
+Seeds a tagged working set (see seed.py) into the PostgreSQL database
+configured by DATABASE_URL (use a scratch database with migrations applied),
+then grows a history of loans returned one to ten years ago through --sizes
+rows, twice:
+
+* archived: the history is loaded straight into ``transaction_archive``, as
+  archive.py leaves it
+* unarchived: the history is loaded into ``transaction``, as before archiving
+
+At each size, with the response cache off, it times the transaction list
+(/transaction/list/data unfiltered, by status, by member, a name search and
+?status=archived) and a loan issued and returned through /transaction/create
+and /transaction/return. The working set is reloaded after each history load
+so it keeps the newest ids, as it would in a real library. Finally the
+unarchived history is moved with archive.archive_returned(), timed, and the
+list and return are measured once more.
+
+Each is run --runs times. Results are printed and saved as JSON (results.py).
+Loading tens of millions of rows takes a while and several GB of disk.
+
+Usage:
+    python benchmarks/history.py --sizes 0,100000,1000000 --runs 20
+    python benchmarks/history.py --sizes 0,1000000,10000000,30000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive
+from app import create_app
+from cache import LocalBackend, set_backend
+from config.config import db
+from models import Book, Member
+from results import save, summarize
+from seed import LOAD_CHUNK, RENT, cleanup, seed, seed_transactions
+
+
+def add_history(table, tag, first, last):
+    """Insert history loans first..last (invoice ids H<tag>-<n>) into table."""
+    sequence = db.execute_sql("""SELECT pg_get_serial_sequence('"transaction"', 'id')""").fetchone()[0]
+    ids = db.execute_sql("""SELECT array(SELECT id FROM member WHERE member_id LIKE %s ORDER BY id),
+                                   array(SELECT id FROM book WHERE isbn LIKE %s ORDER BY id)""",
+                         (f"S{tag}-%", f"bench-{tag}-%")).fetchone()
+    for start in range(first, last + 1, LOAD_CHUNK):
+        end = min(start + LOAD_CHUNK - 1, last)
+        db.execute_sql(f"""
+            INSERT INTO {table} (id, updated_at, change_id, member_id, book_id, issue_date, due_date, return_date,
+                                 rent_fee, fine, status, late_days, invoice_id, arn_status, arn_attempts,
+                                 arn_next_attempt)
+            SELECT
+                nextval(%s), now(), txid_current(),
+                ids.m[1 + mod(g * 7919, array_length(ids.m, 1))],
+                ids.b[1 + mod(g * 104729, array_length(ids.b, 1))],
+                t.issue_date, t.issue_date + 14, t.issue_date + mod(g, 20)::int,
+                {RENT}, 0, 'returned', greatest(mod(g, 20) - 14, 0), 'H{tag}-' || g, 'done', 1, now()
+            FROM generate_series({start}::bigint, {end}) AS g,
+                 LATERAL (SELECT current_date - 365 - mod(g * 31, 3285)::int AS issue_date) AS t,
+                 (SELECT %s::int[] AS m, %s::int[] AS b) AS ids""", (sequence, *ids))
+
+
+def reload_working_set(tag, transactions):
+    """Re-insert the seeded loans so they are newer than the history, as in a real library."""
+    with db.atomic():
+        db.execute_sql("SET LOCAL lms.skip_tombstones = 'on'")
+        db.execute_sql("""DELETE FROM "transaction" WHERE invoice_id LIKE %s""", (f"S{tag}-%",))
+        seed_transactions(transactions, tag)
+    db.execute_sql('ANALYZE "transaction"')
+    db.execute_sql('ANALYZE transaction_archive')
+
+
+def create_desk(tag):
+    """A member and a book of their own for the issue/return runs."""
+    book = Book.create(title=f"History {tag}", author="Bench", isbn=f"history-{tag}", publisher="Bench",
+                       stock=1_000_000, num_pages=1, publication_date=2000, mrp=0.0)
+    member = Member.create(first_name="History", last_name="Desk", member_id=f"H{tag}", email=f"history-{tag}@example.com",
+                           phone="0000000000", locality="-", city="-", state="-", pincode="-", dob=date(2000, 1, 1),
+                           age=20, gender="Other", card_status="Active")
+    return member.id, book.id
+
+
+def measure(client, tag, desk, runs):
+    member_id, book_id = desk
+    lists = {
+        "list": {},
+        "list_issued": {"status": "issued"},
+        "list_overdue": {"status": "overdue"},
+        "list_member": {"member_id": f"S{tag}-1"},
+        "list_search": {"q": "Meera"},
+        "list_archived": {"status": "archived"},
+    }
+    results = {}
+    for name, query in lists.items():
+        durations = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = client.get("/transaction/list/data", query_string=query)
+            durations.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        results[name] = summarize(durations)
+
+    issues, returns = [], []
+    today = date.today()
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.post("/transaction/create", data={
+            "member": member_id, "book": book_id, "issue_date": today.isoformat(),
+            "due_date": (today + timedelta(days=14)).isoformat()})
+        issues.append(time.perf_counter() - started)
+        transaction_id = response.get_json()["transaction_id"]
+        started = time.perf_counter()
+        client.post(f"/transaction/return/{transaction_id}", json={"return_date": today.isoformat()})
+        returns.append(time.perf_counter() - started)
+    results["issue"] = summarize(issues)
+    results["return"] = summarize(returns)
+    return results
+
+
+def remove(tag, desk):
+    member_id, book_id = desk
+    with db.atomic():
+        db.execute_sql("SET LOCAL lms.skip_tombstones = 'on'")
+        for table in ('"transaction"', "transaction_archive"):
+            db.execute_sql(f"DELETE FROM {table} WHERE invoice_id LIKE %s OR member_id = %s",
+                           (f"H{tag}-%", member_id))
+    Member.delete().where(Member.id == member_id).execute()
+    Book.delete().where(Book.id == book_id).execute()
+    cleanup(tag)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0,100000,1000000", help="Comma-separated history sizes")
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--members", type=int, default=5_000)
+    parser.add_argument("--transactions", type=int, default=20_000, help="Loans in the working set")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/history-<time>-<commit>.json)")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    tag = uuid.uuid4().hex[:8]
+    with db.connection_context():
+        seed(args.books, args.members, args.transactions, tag)
+        desk = create_desk(tag)
+
+    client = create_app().test_client()
+    set_backend(LocalBackend(maxsize=0, version_dir=tempfile.mkdtemp()))  # Every request misses
+    results = {}
+
+    def step(series, size, table, loaded):
+        if size > loaded:
+            started = time.perf_counter()
+            with db.connection_context():
+                add_history(table, tag, loaded + 1, size)
+                reload_working_set(tag, args.transactions)
+            print(f"{series}: loaded {size} history rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        for name, summary in measure(client, tag, desk, args.runs).items():
+            results[f"{series}_{size}_{name}"] = summary
+
+    try:
+        loaded = 0
+        for size in sizes:
+            step("archived", size, "transaction_archive", loaded)
+            loaded = size
+        with db.connection_context(), db.atomic():
+            db.execute_sql("SET LOCAL lms.skip_tombstones = 'on'")
+            db.execute_sql("DELETE FROM transaction_archive WHERE invoice_id LIKE %s", (f"H{tag}-%",))
+
+        loaded = 0
+        for size in sizes:
+            step("unarchived", size, '"transaction"', loaded)
+            loaded = size
+
+        started = time.perf_counter()
+        with db.connection_context():
+            moved = archive.archive_returned()
+            db.execute_sql('ANALYZE "transaction"')
+            db.execute_sql('ANALYZE transaction_archive')
+        seconds = time.perf_counter() - started
+        results["archive_move"] = {"rows": moved, "seconds": round(seconds, 1),
+                                   "rows_per_second": round(moved / seconds)}
+        for name, summary in measure(client, tag, desk, args.runs).items():
+            results[f"after_archiving_{loaded}_{name}"] = summary
+    finally:
+        with db.connection_context():
+            remove(tag, desk)
+
+    for name, summary in results.items():
+        print(f"{name:40} " + "  ".join(f"{key}={value}" for key, value in summary.items()))
+    print(f"Saved {save('history', vars(args), results, args.output)}")
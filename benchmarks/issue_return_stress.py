@@ -0,0 +1,134 @@
+"""Concurrency stress test for the issue/return path.
+
+Hammers circulation.issue_book()/return_book() from many threads against the
+PostgreSQL database configured by DATABASE_URL (use a scratch database), then
+checks the invariants that the old read-modify-write code violated:
+
+* stock never goes negative and stock + copies on loan == initial stock
+* every member's outstanding debt == sum of rent on their open loans
+* no member ever exceeds the debt limit
+
+Usage:
+    python benchmarks/issue_return_stress.py --threads 16 --seconds 20 --stock 3
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from peewee import fn
+from config.config import db
+from models import Book, Member, Transaction
+from circulation import CirculationError, MAX_OUTSTANDING_DEBT, issue_book, return_book
+
+RENT = 40
+
+
+def seed(stock, members):
+    tag = uuid.uuid4().hex[:8]
+    book = Book.create(title=f"Stress {tag}", author="Bench", isbn=f"stress-{tag}", publisher="Bench",
+                       stock=stock, num_pages=1, publication_date=2000, mrp=0.0)
+    member_ids = [Member.create(first_name="Stress", last_name=str(i), member_id=f"S{tag}{i}",
+                                email=f"stress-{tag}-{i}@example.com", phone="0000000000", locality="-",
+                                city="-", state="-", pincode="-", dob=date(2000, 1, 1), age=20,
+                                gender="Other", card_status="Active").id
+                  for i in range(members)]
+    return book.id, member_ids
+
+
+def worker(book_id, member_ids, deadline, counters, lock):
+    today = date.today()
+    issued, returned, refused = 0, 0, 0
+    my_loans = []
+    try:
+        while time.monotonic() < deadline:
+            if my_loans and random.random() < 0.5:
+                return_book(my_loans.pop(), today, 0)
+                returned += 1
+                continue
+            try:
+                transaction, _, _ = issue_book(random.choice(member_ids), book_id, today,
+                                               today + timedelta(days=14), RENT)
+                my_loans.append(transaction.id)
+                issued += 1
+            except CirculationError:
+                refused += 1
+    finally:
+        db.close()
+        with lock:
+            counters["issued"] += issued
+            counters["returned"] += returned
+            counters["refused"] += refused
+
+
+def check_invariants(book_id, member_ids, stock):
+    book = Book.get_by_id(book_id)
+    on_loan = Transaction.select().where((Transaction.book == book_id) & (Transaction.status == 'issued')).count()
+    errors = []
+    if book.stock < 0:
+        errors.append(f"negative stock: {book.stock}")
+    if book.stock + on_loan != stock:
+        errors.append(f"stock {book.stock} + on loan {on_loan} != initial {stock}")
+
+    for member in Member.select().where(Member.id.in_(member_ids)):
+        open_rent = (Transaction
+                     .select(fn.COALESCE(fn.SUM(Transaction.rent_fee), 0))
+                     .where((Transaction.member == member.id) & (Transaction.status == 'issued'))
+                     .scalar())
+        if abs(member.outstanding_debt - open_rent) > 1e-6:
+            errors.append(f"member {member.id}: debt {member.outstanding_debt} != open rent {open_rent}")
+        if member.outstanding_debt > MAX_OUTSTANDING_DEBT:
+            errors.append(f"member {member.id}: debt {member.outstanding_debt} over limit")
+    return errors
+
+
+def cleanup(book_id, member_ids):
+    Transaction.delete().where(Transaction.book == book_id).execute()
+    Member.delete().where(Member.id.in_(member_ids)).execute()
+    Book.delete().where(Book.id == book_id).execute()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--stock", type=int, default=3)
+    parser.add_argument("--members", type=int, default=8)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded rows")
+    args = parser.parse_args()
+
+    book_id, member_ids = seed(args.stock, args.members)
+    counters = {"issued": 0, "returned": 0, "refused": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(book_id, member_ids, deadline, counters, lock))
+               for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    errors = check_invariants(book_id, member_ids, args.stock)
+    operations = counters["issued"] + counters["returned"] + counters["refused"]
+    print(f"{args.threads} threads, {elapsed:.1f}s: issued={counters['issued']} "
+          f"returned={counters['returned']} refused={counters['refused']} "
+          f"({operations / elapsed:.0f} ops/s)")
+
+    if not args.keep:
+        cleanup(book_id, member_ids)
+
+    if errors:
+        print("INVARIANTS VIOLATED:")
+        for error in errors:
+            print(f"  {error}")
+        sys.exit(1)
+    print("All invariants hold.")
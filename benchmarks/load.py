@@ -0,0 +1,164 @@
+"""Concurrent HTTP load test over the main request mix.
+
+Seeds a tagged data set (see seed.py) into the PostgreSQL database configured
+by DATABASE_URL (use a scratch database with migrations applied), serves the
+app on a local threaded server -- or targets --url, e.g. gunicorn, which must
+use the same database -- and runs --concurrency client threads for --seconds,
+each picking operations by weight:
+
+* list (40%): a book, member or transaction page, HTML or JSON, random sort
+* search (25%): /book/search for a title word
+* issue (20%): POST /transaction/create for a random seeded member and book
+* return (15%): POST /transaction/return/<id> for an open loan
+
+Issues refused with a 400 (no stock, debt limit) count as completed requests;
+5xx responses and connection errors count as errors. Prints p50/p95/p99
+latency per operation and the overall throughput, and saves them as JSON
+(results.py).
+
+Usage:
+    python benchmarks/load.py --concurrency 16 --seconds 30
+    python benchmarks/load.py --url http://127.0.0.1:8000 --concurrency 64
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from werkzeug.serving import make_server
+from app import create_app
+from config.config import db
+from models import Book, Member, Transaction
+from results import save, summarize
+from search_bench import word
+from seed import cleanup, seed
+
+MIX = {"list": 40, "search": 25, "issue": 20, "return": 15}
+LIST_PAGES = [
+    "/book/list", "/book/list/data?sort=author", "/book/list?in_stock=1&sort=stock&order=desc",
+    "/member/list", "/member/list/data?sort=last_name",
+    "/transaction/list", "/transaction/list/data?status=issued", "/transaction/list?status=overdue",
+]
+
+
+class Scenario:
+    def __init__(self, base_url, member_ids, book_ids, open_loans):
+        self.base_url = base_url
+        self.member_ids = member_ids
+        self.book_ids = book_ids
+        self.open_loans = open_loans
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def take_loan(self):
+        with self.lock:
+            if self.open_loans:
+                return self.open_loans.pop(random.randrange(len(self.open_loans)))
+        return None
+
+    def request(self, session, operation):
+        today = date.today()
+        if operation == "return":
+            loan = self.take_loan()
+            if loan is None:
+                operation = "issue"
+            else:
+                return session.post(f"{self.base_url}/transaction/return/{loan}", json={"return_date": today.isoformat()})
+        if operation == "issue":
+            response = session.post(f"{self.base_url}/transaction/create", data={
+                "member": random.choice(self.member_ids), "book": random.choice(self.book_ids),
+                "issue_date": today.isoformat(), "due_date": (today + timedelta(days=14)).isoformat()})
+            if response.status_code == 201:
+                with self.lock:
+                    self.open_loans.append(response.json()["transaction_id"])
+            return response
+        if operation == "search":
+            return session.get(f"{self.base_url}/book/search", params={"q": word(int(random.paretovariate(1.2)) % 2000)})
+        return session.get(self.base_url + random.choice(LIST_PAGES))
+
+    def worker(self, deadline):
+        session = requests.Session()
+        operations, weights = zip(*MIX.items())
+        while time.monotonic() < deadline:
+            operation = random.choices(operations, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = self.request(session, operation)
+                failed = response.status_code >= 500
+                response.content  # Read the whole body
+            except requests.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.latencies[operation].append(elapsed)
+                if failed:
+                    self.errors[operation] += 1
+
+    def run(self, concurrency, seconds):
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=self.worker, args=(deadline,)) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        results = {}
+        for operation, samples in self.latencies.items():
+            results[operation] = {**summarize(samples), "errors": self.errors[operation]}
+        everything = [s for samples in self.latencies.values() for s in samples]
+        results["all"] = {**summarize(everything), "errors": sum(self.errors.values()),
+                          "requests_per_second": round(len(everything) / elapsed, 1)}
+        return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Server to load (default: start the app on a local threaded server)")
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--members", type=int, default=5_000)
+    parser.add_argument("--transactions", type=int, default=50_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load-<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        tag = seed(args.books, args.members, args.transactions)
+        member_ids = [m.id for m in Member.select(Member.id).where(Member.member_id.startswith(f"S{tag}-"))]
+        book_ids = [b.id for b in Book.select(Book.id).where(Book.isbn.startswith(f"bench-{tag}-"))]
+        open_loans = [t.id for t in Transaction.select(Transaction.id)
+                      .where(Transaction.invoice_id.startswith(f"S{tag}-") & (Transaction.status == 'issued'))]
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)  # No access log line per request
+        server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        results = Scenario(base_url.rstrip("/"), member_ids, book_ids, open_loans).run(args.concurrency, args.seconds)
+    finally:
+        if server is not None:
+            server.shutdown()
+        with db.connection_context():
+            cleanup(tag)
+
+    print(f"{'operation':10} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for operation, summary in results.items():
+        print(f"{operation:10} {summary['count']:9} {summary['errors']:7} {summary.get('p50_ms', 0):8.1f} "
+              f"{summary.get('p95_ms', 0):8.1f} {summary.get('p99_ms', 0):8.1f}")
+    print(f"Throughput: {results['all']['requests_per_second']} requests/s")
+    print(f"Saved {save('load', vars(args), results, args.output)}")
@@ -0,0 +1,207 @@
+"""Micro-benchmarks for the heavy operations outside the list pages.
+
+Seeds a tagged data set (see seed.py) into the PostgreSQL database configured
+by DATABASE_URL (use a scratch database with migrations applied) and times:
+
+* import: books_api.save_books_to_db() inserting and then re-importing
+  (updating) --import-books records
+* fetch: books_api.fetch_books() against the stub library API (stub_frappe.py)
+  with --api-latency-ms per page
+* csv: each CSV download, streamed to the end through the Flask test client
+* bulk_delete: /book/delete-bulk and /member/delete-bulk of --delete rows
+* covers: covers.resolve_batch() for --covers seeded ISBNs against the stub
+  OpenLibrary API (stub_openlibrary.py) with --api-latency-ms per request
+* sync: a full /book/changes sync, then a delta sync after --sync-changes
+  books were updated
+* pdf: a library card through the PDF pool, first rendered then from the disk
+  cache (skipped when WeasyPrint is not installed)
+
+Each is run --runs times. Results are printed and saved as JSON (results.py).
+
+Usage:
+    python benchmarks/micro.py --books 50000 --members 5000 --transactions 50000 --runs 5
+"""
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import books_api
+import covers
+import pdf_render
+from app import create_app
+from config.config import db
+from models import Book, BookCover, Member
+from peewee import fn
+from results import save, summarize
+from seed import cleanup, seed
+from stub_frappe import LIBRARY_PATH, make_book, make_server
+import stub_openlibrary
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def bench_import(records, runs):
+    inserts, updates = [], []
+    for _ in range(runs):
+        prefix = f"micro{uuid.uuid4().hex[:8]}"
+        books = [make_book(n, prefix) for n in range(records)]
+        try:
+            with db.connection_context():
+                inserts.append(timed(books_api.save_books_to_db, books)[0])
+                updates.append(timed(books_api.save_books_to_db, books)[0])
+        finally:
+            with db.connection_context():
+                Book.delete().where(Book.isbn.startswith(f"{prefix}-")).execute()
+    return {
+        "insert": {**summarize(inserts), "books_per_second": round(records / min(inserts), 1)},
+        "update": {**summarize(updates), "books_per_second": round(records / min(updates), 1)},
+    }
+
+
+def bench_fetch(books, latency_ms, runs):
+    server, base_url = make_server(books=books, latency_ms=latency_ms)
+    books_api.API_URL = base_url + LIBRARY_PATH
+    try:
+        durations = [timed(books_api.fetch_books, "", "", "", "", "", books)[0] for _ in range(runs)]
+    finally:
+        server.shutdown()
+    return {"fetch": {**summarize(durations), "books_per_second": round(books / min(durations), 1)}}
+
+
+def bench_csv(client, runs):
+    results = {}
+    for name in ("book", "member", "transaction"):
+        durations, size = [], 0
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = client.get(f"/{name}/download-csv")
+            size = sum(len(chunk) for chunk in response.response)
+            durations.append(time.perf_counter() - started)
+            response.close()
+        results[f"csv_{name}"] = {**summarize(durations), "bytes": size,
+                                  "mb_per_second": round(size / min(durations) / 1e6, 2)}
+    return results
+
+
+def bench_bulk_delete(client, rows, runs):
+    books, members = [], []
+    for _ in range(runs):
+        tag = uuid.uuid4().hex[:8]
+        with db.connection_context():
+            Book.insert_many([{"title": f"Delete {i}", "author": "Bench", "isbn": f"delete-{tag}-{i}",
+                               "publisher": "Bench", "stock": 1, "num_pages": 1, "publication_date": 2000,
+                               "mrp": 0.0} for i in range(rows)]).execute()
+            Member.insert_many([{"first_name": "Delete", "last_name": str(i), "member_id": f"D{tag}-{i}",
+                                 "email": f"delete-{tag}-{i}@example.com", "phone": "0", "locality": "-",
+                                 "city": "-", "state": "-", "pincode": "-", "dob": "2000-01-01", "age": 25,
+                                 "gender": "Other", "card_status": "Active"} for i in range(rows)]).execute()
+            book_ids = [b.id for b in Book.select(Book.id).where(Book.isbn.startswith(f"delete-{tag}-"))]
+            member_ids = [m.id for m in Member.select(Member.id).where(Member.member_id.startswith(f"D{tag}-"))]
+        books.append(timed(client.post, "/book/delete-bulk", json={"book_ids": book_ids})[0])
+        members.append(timed(client.post, "/member/delete-bulk", json={"member_ids": member_ids})[0])
+    return {"bulk_delete_books": summarize(books), "bulk_delete_members": summarize(members)}
+
+
+def bench_covers(tag, count, latency_ms, runs):
+    server, base_url = stub_openlibrary.make_server(latency_ms=latency_ms)
+    covers.OPENLIBRARY_URL = base_url
+    covers.COVER_DIR = tempfile.mkdtemp()
+    durations = []
+    try:
+        with db.connection_context():
+            isbns = [b.isbn for b in Book.select(Book.isbn).where(Book.isbn.startswith(f"bench-{tag}-")).limit(count)]
+            for _ in range(runs):
+                BookCover.delete().where(BookCover.isbn.in_(isbns)).execute()
+                started = time.perf_counter()
+                for first in range(0, len(isbns), covers.COVER_BATCH_SIZE):
+                    covers.resolve_batch(isbns[first:first + covers.COVER_BATCH_SIZE])
+                durations.append(time.perf_counter() - started)
+            BookCover.delete().where(BookCover.isbn.in_(isbns)).execute()
+    finally:
+        server.shutdown()
+        shutil.rmtree(covers.COVER_DIR)
+    return {"covers": {**summarize(durations), "isbns_per_second": round(len(isbns) / min(durations), 1)}}
+
+
+def sync_all(client, cursor=None):
+    pages = 0
+    while True:
+        data = client.get("/book/changes", query_string={"page_size": 500, **({"cursor": cursor} if cursor else {})}).get_json()
+        pages += 1
+        cursor = data["cursor"]
+        if not data["has_more"]:
+            return cursor, pages
+
+
+def bench_sync(client, tag, count, runs):
+    full, delta = [], []
+    for _ in range(runs):
+        duration, (cursor, pages) = timed(sync_all, client)
+        full.append(duration)
+        with db.connection_context():
+            ids = Book.select(Book.id).where(Book.isbn.startswith(f"bench-{tag}-")).order_by(fn.random()).limit(count)
+            Book.update(stock=Book.stock + 1).where(Book.id.in_(ids)).execute()
+        delta.append(timed(sync_all, client, cursor)[0])
+    return {"sync_full": {**summarize(full), "pages": pages}, "sync_delta": {**summarize(delta), "changes": count}}
+
+
+def bench_pdf(client, member_id, runs):
+    if importlib.util.find_spec("weasyprint") is None:
+        return {"pdf": {"skipped": "weasyprint is not installed"}}
+    renders, cached = [], []
+    for _ in range(runs):
+        pdf_render.PDF_CACHE_DIR = tempfile.mkdtemp()  # Empty cache: the first request renders
+        try:
+            renders.append(timed(client.get, f"/member/download-pdf/{member_id}")[0])
+            cached.append(timed(client.get, f"/member/download-pdf/{member_id}")[0])
+        finally:
+            shutil.rmtree(pdf_render.PDF_CACHE_DIR)
+    return {"pdf_render": summarize(renders), "pdf_cached": summarize(cached)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--members", type=int, default=5_000)
+    parser.add_argument("--transactions", type=int, default=50_000)
+    parser.add_argument("--import-books", type=int, default=5_000)
+    parser.add_argument("--api-latency-ms", type=float, default=20)
+    parser.add_argument("--covers", type=int, default=500, help="ISBNs resolved per cover run")
+    parser.add_argument("--sync-changes", type=int, default=100, help="Books updated between syncs")
+    parser.add_argument("--delete", type=int, default=2_000, help="Rows per bulk delete")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/micro-<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        tag = seed(args.books, args.members, args.transactions)
+        member_id = Member.select(Member.id).where(Member.member_id == f"S{tag}-1").scalar()
+
+    client = create_app().test_client()
+    results = {}
+    try:
+        results.update(bench_import(args.import_books, args.runs))
+        results.update(bench_fetch(args.import_books, args.api_latency_ms, args.runs))
+        results.update(bench_covers(tag, args.covers, args.api_latency_ms, args.runs))
+        results.update(bench_csv(client, args.runs))
+        results.update(bench_sync(client, tag, args.sync_changes, args.runs))
+        results.update(bench_bulk_delete(client, args.delete, args.runs))
+        results.update(bench_pdf(client, member_id, args.runs))
+    finally:
+        with db.connection_context():
+            cleanup(tag)
+
+    for name, summary in results.items():
+        print(f"{name:22} " + "  ".join(f"{key}={value}" for key, value in summary.items()))
+    print(f"Saved {save('micro', vars(args), results, args.output)}")
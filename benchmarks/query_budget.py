@@ -0,0 +1,129 @@
+"""Query-count regression check for the list pages and forms.
+
+Seeds more rows than fit on one page into the PostgreSQL database configured
+by DATABASE_URL (use a scratch database), requests each endpoint through the
+Flask test client while counting the SQL statements it executes, and exits
+non-zero if any endpoint goes over its budget. Budgets are per request and do
+not depend on the number of rows, so an N+1 (a lazy ``transaction.member`` or
+``member.transactions`` in a template) shows up as a failure here.
+
+Budgets are for rendering a page from scratch, so the response cache is
+switched off while they are checked; afterwards each cacheable page is
+requested twice with the cache on, and the repeat must run no SQL at all.
+
+Usage:
+    python benchmarks/query_budget.py --rows 120
+"""
+import argparse
+import os
+import sys
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import db
+from models import Book, Member, Transaction
+from app import create_app
+from cache import LocalBackend, set_backend
+
+# endpoint -> maximum number of SQL statements per request
+BUDGETS = {
+    "/book/list": 3,             # page, languages, publishers (filter_option view)
+    "/book/list/data": 1,
+    "/member/list": 3,           # page (with has_transactions), cities, states
+    "/member/list/data": 1,
+    "/transaction/list": 1,      # page (joined); the member filter uses /member/typeahead
+    "/transaction/list/data": 1,
+    "/transaction/create": 0,    # options come from the typeahead endpoints
+    "/member/typeahead?q=budget": 1,
+    "/book/typeahead?q=budget&in_stock=1": 1,
+}
+
+# Endpoints behind @cached_response: a repeated request is served without SQL
+CACHED = ["/book/list", "/book/list/data", "/member/list", "/member/list/data",
+          "/transaction/list", "/transaction/list/data", "/settings"]
+
+
+@contextmanager
+def count_queries():
+    statements = []
+    execute_sql = db.execute_sql
+
+    def counting_execute_sql(sql, params=None, *args, **kwargs):
+        statements.append(sql)
+        return execute_sql(sql, params, *args, **kwargs)
+
+    db.execute_sql = counting_execute_sql
+    try:
+        yield statements
+    finally:
+        del db.execute_sql
+
+
+def seed(rows):
+    tag = uuid.uuid4().hex[:8]
+    today = date.today()
+    book_ids = [Book.create(title=f"Budget {tag} {i}", author="Bench", isbn=f"budget-{tag}-{i}", publisher="Bench",
+                            stock=5, num_pages=1, publication_date=2000, mrp=0.0).id
+                for i in range(rows)]
+    member_ids = [Member.create(first_name="Budget", last_name=str(i), member_id=f"B{tag}{i}",
+                                email=f"budget-{tag}-{i}@example.com", phone="0000000000", locality="-",
+                                city="-", state="-", pincode="-", dob=date(2000, 1, 1), age=20,
+                                gender="Other", card_status="Active").id
+                  for i in range(rows)]
+    for member_id, book_id in zip(member_ids, book_ids):
+        Transaction.create(member=member_id, book=book_id, issue_date=today,
+                           due_date=today + timedelta(days=14), status='issued', rent_fee=0)
+    return book_ids, member_ids
+
+
+def cleanup(book_ids, member_ids):
+    Transaction.delete().where(Transaction.member.in_(member_ids)).execute()
+    Member.delete().where(Member.id.in_(member_ids)).execute()
+    Book.delete().where(Book.id.in_(book_ids)).execute()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=120, help="Books, members and transactions to seed")
+    parser.add_argument("--verbose", action="store_true", help="Print the SQL of endpoints over budget")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        book_ids, member_ids = seed(args.rows)
+
+    failures = 0
+    client = create_app().test_client()
+    version_dir = tempfile.mkdtemp()
+    try:
+        set_backend(LocalBackend(maxsize=0, version_dir=version_dir))  # Every request misses
+        for endpoint, budget in BUDGETS.items():
+            with count_queries() as statements:
+                response = client.get(endpoint)
+            status = "ok" if len(statements) <= budget and response.status_code == 200 else "FAIL"
+            print(f"{status:4} {endpoint:40} {len(statements):3} queries (budget {budget}, HTTP {response.status_code})")
+            if status == "FAIL":
+                failures += 1
+                if args.verbose:
+                    for sql in statements:
+                        print(f"       {sql}")
+
+        set_backend(LocalBackend(version_dir=version_dir))
+        for endpoint in CACHED:
+            client.get(endpoint)
+            with count_queries() as statements:
+                response = client.get(endpoint)
+            status = "ok" if not statements and response.status_code == 200 else "FAIL"
+            print(f"{status:4} {endpoint + ' (cached)':40} {len(statements):3} queries (budget 0, HTTP {response.status_code})")
+            failures += status == "FAIL"
+    finally:
+        with db.connection_context():
+            cleanup(book_ids, member_ids)
+
+    if failures:
+        print(f"{failures} endpoint(s) over budget")
+        sys.exit(1)
+    print("All endpoints within budget.")
@@ -0,0 +1,99 @@
+"""Benchmark result files: latency summaries, saving and comparing across commits.
+
+micro.py and load.py write one JSON file per run to benchmarks/results/
+(named after the benchmark, time and git commit) holding the environment and
+a {name: {metric: value}} map. Comparing two files prints every shared metric
+with its relative change; latencies are in milliseconds.
+
+Usage:
+    python benchmarks/results.py benchmarks/results/load-<old>.json benchmarks/results/load-<new>.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def summarize(seconds):
+    """Latency summary in milliseconds of a list of durations in seconds."""
+    ms = sorted(s * 1000 for s in seconds)
+    if not ms:
+        return {"count": 0}
+
+    def percentile(p):
+        return ms[min(len(ms) - 1, int(round(p / 100 * (len(ms) - 1))))]
+
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def save(benchmark, parameters, results, path=None):
+    """Write a result file and return its path."""
+    env = environment()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{benchmark}-{stamp}-{env['commit'] or 'nogit'}.json")
+    with open(path, "w") as f:
+        json.dump({"benchmark": benchmark, "environment": env, "parameters": parameters, "results": results},
+                  f, indent=2, default=str)
+    return path
+
+
+def compare(old, new):
+    """Print every metric present in both result files with its relative change."""
+    print(f"{'':40} {old['environment']['commit'] or '?':>12} {new['environment']['commit'] or '?':>12}")
+    for name, metrics in old["results"].items():
+        newer = new["results"].get(name)
+        if not isinstance(metrics, dict) or not isinstance(newer, dict):
+            continue
+        for metric, before in metrics.items():
+            after = newer.get(metric)
+            if not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+                continue
+            change = f"{(after - before) / before * 100:+.1f}%" if before else ""
+            print(f"{name + ' ' + metric:40} {before:12.3f} {after:12.3f} {change:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+
+    with open(args.old) as f_old, open(args.new) as f_new:
+        old, new = json.load(f_old), json.load(f_new)
+    if old["benchmark"] != new["benchmark"]:
+        sys.exit(f"Cannot compare {old['benchmark']} results with {new['benchmark']} results")
+    compare(old, new)
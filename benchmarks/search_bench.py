@@ -0,0 +1,132 @@
+"""Latency benchmark for the full-text catalogue search.
+
+Bulk-loads synthetic books (1M by default) into the PostgreSQL database
+configured by DATABASE_URL (use a scratch database with migrations applied),
+then times search.search_catalogue() -- ranked page, total count and both
+facets -- for a set of common, rare and prefix queries (a "+" after the match
+count means the search hit SEARCH_CANDIDATES), and exits non-zero if
+any query's p95 is over budget. The search_vector trigger fills in the
+vectors during the load, exactly as for real imports.
+
+Usage:
+    python benchmarks/search_bench.py --books 1000000 --runs 20 --budget-ms 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import db
+from search import search_catalogue
+
+# Titles are three words from a synthetic vocabulary of SYLLABLES**3 words,
+# drawn with a skew so a few words are very common and most are rare, as in a
+# real catalogue.
+SYLLABLES = ["ka", "ri", "mo", "ven", "sa", "lu", "dor", "ta", "mi", "zen", "ro", "bel",
+             "ni", "gar", "to", "ley", "fa", "shi", "wen", "po", "del", "qu", "ar", "is"]
+VOCABULARY = len(SYLLABLES) ** 3
+AUTHORS = ["Tagore", "Austen", "Tolstoy", "Premchand", "Hugo", "Dickens", "Murakami", "Narayan", "Orwell", "Woolf"]
+PUBLISHERS = ["Penguin", "HarperCollins", "Rupa", "Vintage", "Macmillan", "Bloomsbury", "Scholastic", "Hachette"]
+LANGUAGES = ["English", "Hindi", "French"]
+
+
+def word(n):
+    """The n-th vocabulary word (0 is the most common); mirrors word_sql()."""
+    size = len(SYLLABLES)
+    return SYLLABLES[n % size] + SYLLABLES[n // size % size] + SYLLABLES[n // size ** 2 % size]
+
+
+QUERIES = [
+    word(0),                        # most common title word
+    word(300),                      # mid-frequency word
+    word(9000),                     # rare word
+    f"{word(0)} {word(40)}",        # two common words
+    word(42)[:3],                   # prefix while typing
+    f"tolstoy {word(300)}",         # author + title word
+    "penguin",                      # publisher (one book in eight)
+    "zzzz",                         # no matches
+]
+
+LOAD_CHUNK = 100_000
+
+
+def sql_array(values):
+    return "ARRAY[" + ", ".join(f"'{v}'" for v in values) + "]"
+
+
+def word_sql(seed):
+    """SQL for a skewed random vocabulary word, deterministic in g and seed."""
+    size = len(SYLLABLES)
+    n = f"floor({VOCABULARY} * power(abs(hashint4(g * 7 + {seed})) / 2147483648.0, 3))::int"
+    syllables = sql_array(SYLLABLES)
+    return (f"({syllables})[1 + mod({n}, {size})] || ({syllables})[1 + mod({n} / {size}, {size})] || "
+            f"({syllables})[1 + mod({n} / {size ** 2}, {size})]")
+
+
+def load(books, tag):
+    """Insert synthetic books with generate_series, LOAD_CHUNK rows per statement."""
+    for start in range(0, books, LOAD_CHUNK):
+        end = min(start + LOAD_CHUNK, books)
+        db.execute_sql(f"""
+            INSERT INTO book (title, author, isbn, publisher, stock, num_pages, publication_date, language, mrp, times_issued)
+            SELECT
+                initcap({word_sql(1)} || ' ' || {word_sql(2)} || ' ' || {word_sql(3)}),
+                ({sql_array(AUTHORS)})[1 + mod(g * 17, {len(AUTHORS)})],
+                'bench-{tag}-' || g,
+                ({sql_array(PUBLISHERS)})[1 + mod(g * 11, {len(PUBLISHERS)})],
+                mod(g, 6), 100 + mod(g, 500), 1900 + mod(g, 125),
+                ({sql_array(LANGUAGES)})[1 + mod(g, {len(LANGUAGES)})],
+                100 + mod(g, 900), 0
+            FROM generate_series({start + 1}, {end}) AS g""")
+        print(f"\rLoaded {end}/{books} books", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    db.execute_sql("ANALYZE book")
+
+
+def cleanup(tag):
+    db.execute_sql("DELETE FROM book WHERE isbn LIKE %s", (f"bench-{tag}-%",))
+
+
+def time_query(q, runs):
+    search_catalogue(q)  # warm up caches and plans
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        results = search_catalogue(q)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, f"{results.total}{'+' if results.capped else ''}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50)
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic books")
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:8]
+    failures = 0
+    with db.connection_context():
+        load(args.books, tag)
+        try:
+            print(f"{'query':18} {'matches':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+            for q in QUERIES:
+                timings, total = time_query(q, args.runs)
+                p50 = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                over = p95 > args.budget_ms
+                failures += over
+                print(f"{q:18} {total:>9} {p50:8.1f} {p95:8.1f} {max(timings):8.1f}{'  OVER BUDGET' if over else ''}")
+        finally:
+            if not args.keep:
+                cleanup(tag)
+
+    if failures:
+        print(f"{failures} query(s) over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"All queries within {args.budget_ms:.0f} ms (p95).")
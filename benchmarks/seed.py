@@ -0,0 +1,136 @@
+"""Synthetic data generator for the benchmarks.
+
+Inserts books, members and transactions into the PostgreSQL database
+configured by DATABASE_URL (use a scratch database with migrations applied)
+with generate_series, LOAD_CHUNK rows per statement, so millions of rows load
+in minutes. Titles use the skewed vocabulary of search_bench.py. Seven in ten
+transactions are returned; the rest are open loans (about half of them
+overdue), and members' outstanding debt and books' issue counts agree with
+them. Every row carries a tag in its ISBN, member id or invoice id, printed at
+the end, which --cleanup removes.
+
+Usage:
+    python benchmarks/seed.py --books 100000 --members 20000 --transactions 100000
+    python benchmarks/seed.py --cleanup 1a2b3c4d
+"""
+import argparse
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import db
+from search_bench import load as load_books, sql_array
+
+LOAD_CHUNK = 100_000
+FIRST_NAMES = ["Aarav", "Diya", "Kabir", "Meera", "Rohan", "Sara", "Vivaan", "Anaya", "Arjun", "Isha"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Khan", "Das", "Singh", "Rao", "Gupta", "Nair", "Bose"]
+CITIES = ["Delhi", "Mumbai", "Bengaluru", "Kolkata", "Chennai", "Pune", "Jaipur", "Lucknow"]
+STATES = ["Delhi", "Maharashtra", "Karnataka", "West Bengal", "Tamil Nadu", "Rajasthan", "Uttar Pradesh"]
+RENT = 40
+
+
+def _chunks(total):
+    for start in range(0, total, LOAD_CHUNK):
+        yield start + 1, min(start + LOAD_CHUNK, total)
+
+
+def seed_members(members, tag):
+    for first, last in _chunks(members):
+        db.execute_sql(f"""
+            INSERT INTO member (first_name, last_name, member_id, email, phone, locality, city, state, pincode,
+                                dob, age, gender, outstanding_debt, last_active, card_status, card_expiry)
+            SELECT
+                ({sql_array(FIRST_NAMES)})[1 + mod(g, {len(FIRST_NAMES)})],
+                ({sql_array(LAST_NAMES)})[1 + mod(g / {len(FIRST_NAMES)}, {len(LAST_NAMES)})],
+                'S{tag}-' || g,
+                'seed-{tag}-' || g || '@example.com',
+                '9' || lpad(mod(g, 1000000000)::text, 9, '0'),
+                g || ' Main Road',
+                ({sql_array(CITIES)})[1 + mod(g, {len(CITIES)})],
+                ({sql_array(STATES)})[1 + mod(g, {len(STATES)})],
+                lpad(mod(g * 37, 1000000)::text, 6, '0'),
+                date '1960-01-01' + mod(g * 13, 16000),
+                date_part('year', age(date '1960-01-01' + mod(g * 13, 16000)))::int,
+                (ARRAY['Male', 'Female', 'Other'])[1 + mod(g, 3)],
+                0, NULL,
+                CASE WHEN mod(g, 20) = 0 THEN 'Inactive' ELSE 'Active' END,
+                current_date + mod(g, 730)
+            FROM generate_series({first}, {last}) AS g""")
+
+
+def seed_transactions(transactions, tag):
+    member_ids = [row[0] for row in db.execute_sql(
+        "SELECT id FROM member WHERE member_id LIKE %s ORDER BY id", (f"S{tag}-%",))]
+    book_ids = [row[0] for row in db.execute_sql(
+        "SELECT id FROM book WHERE isbn LIKE %s ORDER BY id", (f"bench-{tag}-%",))]
+    if not member_ids or not book_ids:
+        return
+    for first, last in _chunks(transactions):
+        # Open loans were issued in the last 30 days, returned ones within the last year
+        db.execute_sql(f"""
+            INSERT INTO "transaction" (member_id, book_id, issue_date, due_date, return_date, rent_fee, fine,
+                                       status, late_days, invoice_id, arn_status, arn_attempts, arn_next_attempt)
+            SELECT
+                ids.m[1 + mod(g * 7919, array_length(ids.m, 1))],
+                ids.b[1 + mod(g * 104729, array_length(ids.b, 1))],
+                t.issue_date, t.issue_date + 14,
+                CASE WHEN t.returned THEN t.issue_date + mod(g, 20) END,
+                {RENT}, 0,
+                CASE WHEN t.returned THEN 'returned' ELSE 'issued' END,
+                0, 'S{tag}-' || g, 'done', 1, now()
+            FROM generate_series({first}, {last}) AS g,
+                 LATERAL (SELECT mod(g, 10) < 7 AS returned,
+                                 current_date - CASE WHEN mod(g, 10) < 7 THEN mod(g, 365) ELSE mod(g, 30) END
+                                     AS issue_date) AS t,
+                 (SELECT %s::int[] AS m, %s::int[] AS b) AS ids""", (member_ids, book_ids))
+
+    # Make popularity and debt agree with the loans (stock counts copies on the shelf, so it stands)
+    db.execute_sql("""UPDATE book SET times_issued = loans.total
+        FROM (SELECT book_id, count(*) AS total FROM "transaction" WHERE invoice_id LIKE %s GROUP BY book_id) AS loans
+        WHERE book.id = loans.book_id""", (f"S{tag}-%",))
+    db.execute_sql("""UPDATE member SET outstanding_debt = loans.debt, last_active = loans.last_active
+        FROM (SELECT member_id, coalesce(sum(rent_fee) FILTER (WHERE status = 'issued'), 0) AS debt,
+                     max(issue_date) AS last_active
+              FROM "transaction" WHERE invoice_id LIKE %s GROUP BY member_id) AS loans
+        WHERE member.id = loans.member_id""", (f"S{tag}-%",))
+
+
+def seed(books, members, transactions, tag=None):
+    """Load a tagged data set and return its tag."""
+    tag = tag or uuid.uuid4().hex[:8]
+    with db.atomic():
+        load_books(books, tag)
+        seed_members(members, tag)
+        seed_transactions(transactions, tag)
+    db.execute_sql('ANALYZE member')
+    db.execute_sql('ANALYZE "transaction"')
+    return tag
+
+
+def cleanup(tag):
+    with db.atomic():
+        for table in ('"transaction"', "transaction_archive"):
+            db.execute_sql(f"""DELETE FROM {table} WHERE member_id IN (SELECT id FROM member WHERE member_id LIKE %s)
+                               OR book_id IN (SELECT id FROM book WHERE isbn LIKE %s)""", (f"S{tag}-%", f"bench-{tag}-%"))
+        db.execute_sql("DELETE FROM member WHERE member_id LIKE %s", (f"S{tag}-%",))
+        db.execute_sql("DELETE FROM book WHERE isbn LIKE %s", (f"bench-{tag}-%",))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--members", type=int, default=2_000)
+    parser.add_argument("--transactions", type=int, default=10_000)
+    parser.add_argument("--cleanup", metavar="TAG", help="Delete a previously seeded data set instead")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        if args.cleanup:
+            cleanup(args.cleanup)
+            print(f"Removed data set {args.cleanup}")
+        else:
+            tag = seed(args.books, args.members, args.transactions)
+            print(f"Seeded {args.books} books, {args.members} members and {args.transactions} transactions")
+            print(f"Tag: {tag}  (remove with: python benchmarks/seed.py --cleanup {tag})")
@@ -0,0 +1,139 @@
+"""Startup cost of a web worker: import time and memory.
+
+* import: --runs fresh interpreters each import app and call create_app().
+  Reports the time taken, the resident memory afterwards and whether any of
+  the lazily imported heavy modules (WeasyPrint, requests, Pillow, redis) got
+  loaded anyway.
+* gunicorn (with --gunicorn): starts ``gunicorn "app:create_app()"`` with
+  --workers, with and without --preload, times how long until it answers
+  /metrics, and reports RSS, PSS and private memory per worker (Linux only).
+  /metrics checks out a pooled connection like any request, so DATABASE_URL
+  must point at a reachable database.
+
+Results are printed and saved as JSON (results.py).
+
+Usage:
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --gunicorn --workers 4
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from results import save, summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("weasyprint", "requests", "PIL", "redis")
+
+# Runs in a fresh interpreter; prints one JSON line
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+app.create_app()
+elapsed = time.perf_counter() - started
+rss_kb = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss_kb = int(line.split()[1])
+print(json.dumps({"seconds": elapsed, "rss_kb": rss_kb, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def bench_import(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE % (HEAVY_MODULES,)], cwd=ROOT,
+                                check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    rss = sorted(s["rss_kb"] for s in samples)
+    return {"import": {**summarize([s["seconds"] for s in samples]), "rss_mb": round(rss[len(rss) // 2] / 1024, 1),
+                       "heavy_modules_loaded": sorted({m for s in samples for m in s["loaded"]})}}
+
+
+def memory_kb(pid):
+    """RSS, PSS and private (unshared) memory of a process, in kB."""
+    usage = {"rss": 0, "pss": 0, "private": 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key == "Rss":
+                usage["rss"] = int(value.split()[0])
+            elif key == "Pss":
+                usage["pss"] = int(value.split()[0])
+            elif key in ("Private_Clean", "Private_Dirty"):
+                usage["private"] += int(value.split()[0])
+    return usage
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_gunicorn(workers, preload, timeout=60):
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+               "--log-level", "warning"] + (["--preload"] if preload else []) + ["app:create_app()"]
+    started = time.perf_counter()
+    master = subprocess.Popen(command, cwd=ROOT)
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+                    response.read()
+                break
+            except OSError:
+                if master.poll() is not None or time.perf_counter() - started > timeout:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.02)
+        ready = time.perf_counter() - started
+
+        # Let every worker finish booting before measuring them
+        deadline = time.perf_counter() + timeout
+        while len(children(master.pid)) < workers and time.perf_counter() < deadline:
+            time.sleep(0.1)
+        time.sleep(1)
+        per_worker = [memory_kb(pid) for pid in children(master.pid)]
+    finally:
+        master.terminate()
+        master.wait()
+
+    def mb(key):
+        return round(sum(w[key] for w in per_worker) / len(per_worker) / 1024, 1)
+
+    return {"first_response_ms": round(ready * 1000, 1), "workers": len(per_worker),
+            "rss_mb_per_worker": mb("rss"), "pss_mb_per_worker": mb("pss"),
+            "private_mb_per_worker": mb("private")}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--gunicorn", action="store_true", help="Also measure gunicorn workers")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/startup-<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    results = bench_import(args.runs)
+    if args.gunicorn:
+        results["gunicorn"] = bench_gunicorn(args.workers, preload=False)
+        results["gunicorn_preload"] = bench_gunicorn(args.workers, preload=True)
+
+    for name, summary in results.items():
+        print(f"{name:18} " + "  ".join(f"{key}={value}" for key, value in summary.items()))
+    print(f"Saved {save('startup', vars(args), results, args.output)}")
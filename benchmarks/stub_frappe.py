@@ -0,0 +1,117 @@
+"""Stand-in for the Frappe library and e-invoice APIs.
+
+Serves ``GET /api/method/frappe-library`` (pages of API_PAGE_SIZE made-up
+books, up to --books in all, in the API's {"message": [...]} envelope) and
+``POST /api/method/generate-pro-einvoice-id`` (a fresh ARN per call), with
+optional latency and error rate, so imports and the ARN worker can be
+benchmarked without the network. Point the app at it with:
+
+    BOOKS_API_URL=http://127.0.0.1:8089/api/method/frappe-library
+    ARN_BASE_URL=http://127.0.0.1:8089
+
+Usage:
+    python benchmarks/stub_frappe.py --port 8089 --latency-ms 50 --error-rate 0.01
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PAGE_SIZE = 20  # Same as books_api.API_PAGE_SIZE
+LIBRARY_PATH = "/api/method/frappe-library"
+ARN_PATH = "/api/method/generate-pro-einvoice-id"
+
+
+def make_book(n, prefix="stub"):
+    """The n-th stub book, shaped like a Frappe library API record."""
+    return {
+        "bookID": str(n),
+        "title": f"Stub Book {n}",
+        "authors": f"Author {n % 500}",
+        "isbn": f"{prefix}-{n}",
+        "publisher": f"Publisher {n % 40}",
+        "num_pages": str(100 + n % 700),
+        "publication_date": f"1/1/{1950 + n % 75}",
+        "language_code": ["eng", "hin", "fre"][n % 3],
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Set by make_server()
+    books = 0
+    latency = 0.0
+    error_rate = 0.0
+    prefix = "stub"
+    counter = itertools.count(1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _delay_or_fail(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self._reply(503, {"exc": "stub failure"})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != LIBRARY_PATH:
+            return self._reply(404, {"exc": "not found"})
+        if self._delay_or_fail():
+            return
+        page = int(parse_qs(url.query).get("page", ["1"])[0])
+        first = (page - 1) * API_PAGE_SIZE
+        last = min(first + API_PAGE_SIZE, self.books)
+        self._reply(200, {"message": [make_book(n, self.prefix) for n in range(first, last)]})
+
+    def do_POST(self):
+        if urlparse(self.path).path != ARN_PATH:
+            return self._reply(404, {"exc": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self._delay_or_fail():
+            return
+        self._reply(200, {"arn": f"ARN-{self.prefix}-{next(self.counter)}"})
+
+
+def make_server(port=0, books=10_000, latency_ms=0.0, error_rate=0.0, prefix=None):
+    """Start the stub in a background thread. Returns (server, base_url); call server.shutdown() to stop."""
+    handler = type("Handler", (StubHandler,), {
+        "books": books, "latency": latency_ms / 1000, "error_rate": error_rate,
+        "prefix": prefix or f"stub{uuid.uuid4().hex[:6]}", "counter": itertools.count(1),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--books", type=int, default=10_000, help="Books the library API has in total")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server, base_url = make_server(args.port, args.books, args.latency_ms, args.error_rate)
+    print(f"Stub Frappe APIs on {base_url} (BOOKS_API_URL={base_url}{LIBRARY_PATH} ARN_BASE_URL={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,101 @@
+"""Stand-in for the OpenLibrary books and covers APIs used by covers.py.
+
+Serves ``GET /api/books?bibkeys=ISBN:...&format=json`` -- three in four ISBNs
+have a cover, and one in ten of those covers is missing when downloaded, as
+with the real service -- and ``GET /b/id/<n>-<size>.jpg``, a generated JPEG.
+Run the resolver against it with:
+
+    OPENLIBRARY_URL=http://127.0.0.1:8090 python covers.py --once
+
+Usage:
+    python benchmarks/stub_openlibrary.py --port 8090 --latency-ms 30
+"""
+import argparse
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+COVER_PATH = re.compile(r"^/b/id/(\d+)-([SML])\.jpg$")
+SIZES = {"S": (45, 68), "M": (180, 270), "L": (400, 600)}
+
+
+def cover_id(isbn):
+    """Stable cover id for an ISBN, or None for the quarter without a cover."""
+    n = int(hashlib.sha1(isbn.encode()).hexdigest()[:8], 16)
+    return None if n % 4 == 0 else n
+
+
+@lru_cache(maxsize=1024)
+def cover_image(n, size):
+    from PIL import Image
+    image = Image.new("RGB", SIZES[size], ((n * 67) % 256, (n * 131) % 256, (n * 29) % 256))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=85)
+    return out.getvalue()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0  # Set by make_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlparse(self.path)
+        host = f"http://{self.headers['Host']}"
+
+        if url.path == "/api/books":
+            bibkeys = parse_qs(url.query).get("bibkeys", [""])[0].split(",")
+            books = {}
+            for key in filter(None, bibkeys):
+                n = cover_id(key.split(":", 1)[-1])
+                if n is not None:
+                    books[key] = {"bib_key": key, "thumbnail_url": f"{host}/b/id/{n}-S.jpg"}
+            return self._reply(200, json.dumps(books).encode())
+
+        match = COVER_PATH.match(url.path)
+        if match:
+            n, size = int(match.group(1)), match.group(2)
+            if n % 10 == 1:
+                return self._reply(404, b"not found", "text/plain")
+            return self._reply(200, cover_image(n, size), "image/jpeg")
+
+        self._reply(404, b"not found", "text/plain")
+
+
+def make_server(port=0, latency_ms=0.0):
+    """Start the stub in a background thread. Returns (server, base_url); call server.shutdown() to stop."""
+    handler = type("Handler", (StubHandler,), {"latency": latency_ms / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    args = parser.parse_args()
+
+    server, base_url = make_server(args.port, args.latency_ms)
+    print(f"Stub OpenLibrary on {base_url} (OPENLIBRARY_URL={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,76 +1,189 @@
-import requests
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from peewee import EXCLUDED
 from models import Book
 from config.config import db
+from metrics import EXTERNAL_HTTP
 
-API_URL = "https://frappe.io/api/method/frappe-library"
+log = logging.getLogger(__name__)
 
-def fetch_books(title, authors, isbn, publisher, num_pages, required_books):
+API_URL = os.getenv("BOOKS_API_URL", "https://frappe.io/api/method/frappe-library")
+API_PAGE_SIZE = 20  # Books returned per page by the library API
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", 4))  # Max pages downloaded at once
+FETCH_MAX_PAGES = int(os.getenv("FETCH_MAX_PAGES", 500))  # Hard limit on pages requested per fetch
+
+# Outbound HTTP settings
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+
+# Rows per INSERT ... ON CONFLICT statement when importing books
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return a shared requests.Session with a keep-alive connection pool."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Imported here: requests costs every web worker ~60 ms at startup, and most never call out
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            session = requests.Session()
+            # Idempotent requests (GET) are retried with backoff on connection errors and 5xx/429
+            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+def fetch_page(params, page, session=None):
+    """Fetch a single page of results from the library API ([] on failure)."""
+    import requests
+    session = session or get_session()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = session.get(API_URL, params={**params, "page": page}, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        books = response.json().get("message", [])
+        outcome = "ok"
+        return books
+    except (requests.RequestException, ValueError) as e:
+        log.warning("Error fetching books page %s: %s", page, e)
+        return []
+    finally:
+        EXTERNAL_HTTP.observe(time.perf_counter() - started, service="books", outcome=outcome)
+
+def fetch_books(title, authors, isbn, publisher, num_pages, required_books, max_workers=FETCH_WORKERS):
+    """Fetch up to required_books unique books, downloading pages concurrently in waves.
+
+    Stops early when the API runs out of pages, when a whole wave adds no new
+    book (an API that ignores ``page``, or fewer matching books than asked for)
+    or after FETCH_MAX_PAGES pages.
+    """
+    params = {
+        "title": title,
+        "authors": authors,
+        "isbn": isbn,
+        "publisher": publisher,
+        "num_pages": num_pages
+    }
+    session = get_session()
     fetched_books = []
+    seen_isbns = set()
     page = 1
 
-    while len(fetched_books) < required_books:
-        params = {
-            "title": title,
-            "authors": authors,
-            "isbn": isbn,
-            "publisher": publisher,
-            "num_pages": num_pages
-        }
-        response = requests.get(API_URL, params=params)
-        data = response.json().get("message", [])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(fetched_books) < required_books and page <= FETCH_MAX_PAGES:
+            remaining = required_books - len(fetched_books)
+            wave = min(max_workers, math.ceil(remaining / API_PAGE_SIZE), FETCH_MAX_PAGES - page + 1)
+            results = executor.map(lambda p: fetch_page(params, p, session), range(page, page + wave))
+            page += wave
 
-        if not data:  # Stop if no more books are available
-            break  
+            exhausted = False
+            found = len(fetched_books)
+            for data in results:  # Results arrive in page order
+                if not data:  # Stop if no more books are available
+                    exhausted = True
+                    break
+                for book in data:
+                    key = book.get("isbn") or book.get("bookID")
+                    if key in seen_isbns:
+                        continue
+                    seen_isbns.add(key)
+                    fetched_books.append(book)
 
-        fetched_books.extend(data)
-        page += 1  
+            if exhausted or len(fetched_books) == found:
+                break
 
     return fetched_books[:required_books]  # Return exactly required_books
 
-def save_books_to_db(books):
-    """Save fetched books into the database, updating stock if the book already exists."""
-    added_books = 0
-    
+def normalize_book(book):
+    """Map an API (or dump) record to Book column values. Raises on unusable records."""
+    isbn = (book.get("isbn") or "").strip()
+    title = (book.get("title") or "").strip()
+    if not isbn or not title:
+        raise ValueError("Book record needs a title and an ISBN")
+
+    return {
+        "title": title,
+        "author": book.get("authors") or "Unknown",
+        "isbn": isbn,
+        "publisher": book.get("publisher") or "N/A",
+        "num_pages": int(book.get("num_pages") or 0),
+        "publication_date": int(str(book.get("publication_date") or "2000").split("/")[-1]),  # Extracting year
+        "language": book.get("language_code") or "English",
+        "stock": 1,  # One copy per record
+        "mrp": 0.0,  # Default value (you can update this)
+        "times_issued": 0
+    }
+
+def save_books_to_db(books, batch_size=IMPORT_BATCH_SIZE):
+    """Upsert fetched books in bulk: new ISBNs are inserted, known ones get their stock increased.
+
+    Records sharing an ISBN are coalesced first, each adding one copy to stock. Every
+    chunk costs one ISBN lookup and one INSERT ... ON CONFLICT, and the whole import runs
+    in a single transaction so a failure leaves the catalogue untouched.
+    """
+    started = time.perf_counter()
+    inserted = updated = rejected = received = 0
+
+    rows = {}
     for book in books:
-        title = book["title"]
-        authors = book.get("authors", "Unknown")
-        isbn = book.get("isbn", None)
-        publisher = book.get("publisher", "N/A")
-        num_pages = int(book.get("num_pages", 0))
-        publication_date = int(book.get("publication_date", "2000").split("/")[-1])  # Extracting year
-        language = book.get("language_code", "English")
-        
-        # Check if the book already exists based on ISBN
-        existing_book = Book.get_or_none(Book.isbn == isbn)
-
-        if existing_book:
-            # Update stock count
-            existing_book.stock += 1
-            existing_book.save()
+        received += 1
+        try:
+            row = normalize_book(book)
+        except (AttributeError, TypeError, ValueError):
+            rejected += 1
+            continue
+
+        if row["isbn"] in rows:
+            rows[row["isbn"]]["stock"] += 1
         else:
-            # Create new book entry
-            Book.create(
-                title=title,
-                author=authors,
-                isbn=isbn,
-                publisher=publisher,
-                num_pages=num_pages,
-                publication_date=publication_date,
-                language=language,
-                stock=1,  # Initial stock count
-                mrp=0.0,  # Default value (you can update this)
-                times_issued=0
-            )
-            added_books += 1
-    
-    return {"success": f"{added_books} new books added, existing books updated!"}
+            rows[row["isbn"]] = row
+
+    rows = list(rows.values())
+    with db.atomic():
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            existing = Book.select().where(Book.isbn.in_([row["isbn"] for row in chunk])).count()
+
+            (Book
+             .insert_many(chunk)
+             .on_conflict(conflict_target=[Book.isbn], update={Book.stock: Book.stock + EXCLUDED.stock})
+             .execute())
+
+            updated += existing
+            inserted += len(chunk) - existing
+
+    elapsed = time.perf_counter() - started
+    return {
+        "success": f"{inserted} new books added, {updated} existing books updated!",
+        "inserted": inserted,
+        "updated": updated,
+        "rejected": rejected,
+        "seconds": round(elapsed, 3),
+        "books_per_second": round(received / elapsed, 1) if elapsed else None
+    }
 
 # External API Configuration
-BASE_URL = "https://frappe.school"
+BASE_URL = os.getenv("ARN_BASE_URL", "https://frappe.school")
 ARN_API_ENDPOINT = "/api/method/generate-pro-einvoice-id"
 
-def generate_arn(transaction):
+def generate_arn(transaction, session=None):
     """Sends invoice details to the API to get an ARN number."""
+    session = session or get_session()
+    started = time.perf_counter()
+    outcome = "error"
     try:
         payload = {
             "customer_name": transaction.member.first_name,
@@ -78,14 +191,17 @@ def generate_arn(transaction):
             "payable_amount": transaction.rent_fee
         }
 
-        response = requests.post(f"{BASE_URL}{ARN_API_ENDPOINT}", json=payload)
+        response = session.post(f"{BASE_URL}{ARN_API_ENDPOINT}", json=payload, timeout=HTTP_TIMEOUT)
 
         if response.status_code == 200:
             data = response.json()
+            outcome = "ok"
             return data.get("arn", None)
         else:
-            print(f"Failed to fetch ARN. Status Code: {response.status_code}, Response: {response.text}")
+            log.warning("Failed to fetch ARN. Status Code: %s, Response: %s", response.status_code, response.text)
             return None
     except Exception as e:
-        print(f"Error fetching ARN: {str(e)}")
-        return None
\ No newline at end of file
+        log.warning("Error fetching ARN: %s", e)
+        return None
+    finally:
+        EXTERNAL_HTTP.observe(time.perf_counter() - started, service="arn", outcome=outcome)
\ No newline at end of file
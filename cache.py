@@ -0,0 +1,166 @@
+"""Caches.
+
+``LRUCache`` keeps at most ``maxsize`` entries, each valid for ``ttl`` seconds,
+evicting the least recently used entry when full. It is per worker process and
+meant for hot, short-lived lookups where a few seconds of staleness is fine.
+
+The response cache (response_cache.py) stores through a backend, chosen by
+``CACHE_URL``:
+
+* unset: ``LocalBackend``, values in a per-process ``LRUCache``;
+* ``redis://...``: ``RedisBackend``, values shared by every worker and host
+  (needs the ``redis`` package).
+
+Both backends keep a version number per namespace ("book", "member", ...).
+``invalidate()`` bumps it, and cached entries are keyed on the versions of the
+namespaces they were built from, so an invalidation makes every dependent
+entry unreachable at once without having to find and delete them. The local
+backend keeps its versions in small files, so an invalidation made by one
+worker process (or by a script such as arn_worker.py) is seen by all others
+on the host.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_URL = os.getenv("CACHE_URL")
+CACHE_VERSION_DIR = os.getenv("CACHE_VERSION_DIR", os.path.join(BASE_DIR, "instance", "cache_versions"))
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= time.monotonic():
+                if entry is not _MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for key, computing and storing it on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LocalBackend:
+    """Values in this process's memory, namespace versions in files shared by the host."""
+
+    def __init__(self, maxsize: int = 512, version_dir: str = CACHE_VERSION_DIR):
+        self.values = LRUCache(maxsize=maxsize)
+        self.version_dir = version_dir
+
+    def get(self, key: str) -> Any:
+        return self.values.get(key)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.values.set(key, value, ttl)
+
+    def _version_path(self, namespace: str) -> str:
+        return os.path.join(self.version_dir, namespace)
+
+    def version(self, namespace: str) -> int:
+        try:
+            return os.stat(self._version_path(namespace)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def bump(self, namespace: str) -> None:
+        path = self._version_path(namespace)
+        os.makedirs(self.version_dir, exist_ok=True)
+        # The version is the file's mtime; make sure it always moves forward
+        stamp = max(time.time_ns(), self.version(namespace) + 1)
+        with open(path, "a"):
+            os.utime(path, ns=(stamp, stamp))
+
+    def clear(self) -> None:
+        self.values.clear()
+
+
+class RedisBackend:
+    """Values and namespace versions in Redis, shared by every worker and host."""
+
+    def __init__(self, url: str, prefix: str = "lms:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        data = self.client.get(self.prefix + key)
+        return None if data is None else json.loads(data)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+    def version(self, namespace: str) -> int:
+        return int(self.client.get(f"{self.prefix}version:{namespace}") or 0)
+
+    def bump(self, namespace: str) -> None:
+        self.client.incr(f"{self.prefix}version:{namespace}")
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(self.prefix + "response:*"):
+            self.client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if CACHE_URL:
+                    _backend = RedisBackend(CACHE_URL)
+                else:
+                    _backend = LocalBackend(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", 512)))
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """Replace the backend, e.g. with a LocalBackend stand-in for Redis in benchmarks."""
+    global _backend
+    _backend = backend
+
+
+def invalidate(*namespaces: str) -> None:
+    """Make every cached entry built from any of these namespaces stale."""
+    backend = get_backend()
+    for namespace in namespaces:
+        backend.bump(namespace)
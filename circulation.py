@@ -0,0 +1,104 @@
+"""Issue and return operations, each executed as a single atomic unit.
+
+Stock and debt are never read into Python and written back. Each change is a
+conditional UPDATE (``stock = stock - 1 WHERE stock > 0``,
+``outstanding_debt = outstanding_debt + rent WHERE ... <= limit``) that
+PostgreSQL applies under a row lock, and the whole issue or return runs inside
+``db.atomic()`` so a rejected step rolls back the earlier ones. Rows are always
+touched in the same order (transaction, member, book, then the stats
+counters) to avoid deadlocks between concurrent issues and returns.
+"""
+from datetime import timedelta
+from peewee import fn
+from config.config import db
+from models import Book, Member, Transaction
+from fines import late_days
+from stats import record_issue, record_return
+
+MAX_OUTSTANDING_DEBT = 500
+MIN_LOAN_DAYS = 14
+
+
+class CirculationError(Exception):
+    """An issue or return that was refused; the message is safe to show to the user."""
+
+
+def issue_book(member_id, book_id, issue_date, due_date, rent):
+    """Issue one copy of a book, charging rent to the member. Returns (transaction, member, book)."""
+    # Validate due date is at least 14 days after issue date
+    if due_date < issue_date + timedelta(days=MIN_LOAN_DAYS):
+        raise CirculationError(f"Due date must be at least {MIN_LOAN_DAYS} days after issue date")
+
+    with db.atomic():
+        members = list(Member
+                       .update(outstanding_debt=Member.outstanding_debt + rent, last_active=issue_date)
+                       .where((Member.id == member_id) &
+                              (Member.outstanding_debt + rent <= MAX_OUTSTANDING_DEBT))
+                       .returning(Member.id, Member.first_name, Member.last_name)
+                       .execute())
+        if not members:
+            if not Member.select().where(Member.id == member_id).exists():
+                raise CirculationError("Member not found")
+            raise CirculationError(f"Cannot issue book. Outstanding debt would exceed ₹{MAX_OUTSTANDING_DEBT}")
+
+        books = list(Book
+                     .update(stock=Book.stock - 1, times_issued=Book.times_issued + 1)
+                     .where((Book.id == book_id) & (Book.stock > 0))
+                     .returning(Book.id, Book.title)
+                     .execute())
+        if not books:
+            if not Book.select().where(Book.id == book_id).exists():
+                raise CirculationError("Book not found")
+            raise CirculationError("Cannot issue book. No copies left in stock")
+
+        transaction = Transaction.create(
+            member=member_id,
+            book=book_id,
+            issue_date=issue_date,
+            due_date=due_date,
+            status='issued',
+            rent_fee=rent
+        )
+        record_issue(issue_date, book_id)
+
+    return transaction, members[0], books[0]
+
+
+def return_book(transaction_id, return_date, fine_per_day):
+    """Mark an issued transaction returned, charging the late fine, restock the book and settle the debt.
+
+    Returns the transaction (with the final late_days and fine).
+    """
+    with db.atomic():
+        # Lock the loan and read the fine already accrued into the member's debt by fines.py
+        accrued = (Transaction
+                   .select(Transaction.fine)
+                   .where((Transaction.id == transaction_id) & (Transaction.status == 'issued'))
+                   .for_update()
+                   .first())
+        if accrued is None:
+            raise CirculationError("Transaction not found or already returned")
+
+        days_late = late_days(return_date, Transaction.due_date)
+        transaction = (Transaction
+                       .update(return_date=return_date, late_days=days_late, fine=days_late * fine_per_day,
+                               status='returned')
+                       .where(Transaction.id == transaction_id)
+                       .returning(Transaction.id, Transaction.member, Transaction.book, Transaction.rent_fee,
+                                  Transaction.late_days, Transaction.fine, Transaction.invoice_id)
+                       .execute())[0]
+
+        # The rent and the accrued fine are paid on return, so clear both from the member's debt
+        (Member
+         .update(outstanding_debt=fn.GREATEST(0, Member.outstanding_debt - transaction.rent_fee - accrued.fine),
+                 last_active=return_date)
+         .where(Member.id == transaction.member_id)
+         .execute())
+
+        (Book
+         .update(stock=Book.stock + 1)
+         .where(Book.id == transaction.book_id)
+         .execute())
+        record_return(return_date, transaction.book_id)
+
+    return transaction
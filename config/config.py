@@ -1,5 +1,9 @@
-from peewee import PostgresqlDatabase
+from peewee import InterfaceError, OperationalError
+from playhouse.postgres_ext import PostgresqlExtDatabase, PooledPostgresqlExtDatabase
+from playhouse.shortcuts import ReconnectMixin
 import os
+import threading
+import time
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 
@@ -31,11 +35,106 @@ else:
         'port': 5432
     }
 
-# Initialize the Peewee database
-db = PostgresqlDatabase(
-    DATABASE['name'], 
-    user=DATABASE['user'], 
-    password=DATABASE['password'], 
-    host=DATABASE['host'], 
-    port=DATABASE['port']
-)
+# Connection pool settings
+DB_POOL = os.getenv("DB_POOL", "true").lower() in ("1", "true", "yes")
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 20))
+DB_STALE_TIMEOUT = int(os.getenv("DB_STALE_TIMEOUT", 300))  # Seconds before an idle connection is recycled
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))  # Seconds to wait for a free connection
+
+# Called as hook(sql, params, seconds) after every statement (see metrics.py)
+query_hooks = []
+
+
+class _ReconnectOnDisconnect(ReconnectMixin):
+    """Transparently reconnect and retry a statement when the server dropped the connection.
+
+    Only statements outside a transaction are retried (see ReconnectMixin).
+    """
+    reconnect_errors = (
+        (OperationalError, 'server closed the connection'),
+        (OperationalError, 'terminating connection'),
+        (OperationalError, 'could not receive data from server'),
+        (InterfaceError, 'connection already closed'),
+    )
+
+    def execute_sql(self, sql, params=None, named_cursor=None):
+        started = time.perf_counter()
+        try:
+            if named_cursor:
+                # Server-side cursors always run inside a transaction, so never retried
+                return super(ReconnectMixin, self).execute_sql(sql, params, named_cursor=named_cursor)
+            return super().execute_sql(sql, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            for hook in query_hooks:
+                hook(sql, params, elapsed)
+
+
+class ReconnectingDatabase(_ReconnectOnDisconnect, PostgresqlExtDatabase):
+    pass
+
+
+class ReconnectingPooledDatabase(_ReconnectOnDisconnect, PooledPostgresqlExtDatabase):
+    pass
+
+
+# Initialize the Peewee database (the Ext variant adds server-side cursors for streaming exports)
+if DB_POOL:
+    db = ReconnectingPooledDatabase(
+        DATABASE['name'],
+        user=DATABASE['user'],
+        password=DATABASE['password'],
+        host=DATABASE['host'],
+        port=DATABASE['port'],
+        max_connections=DB_MAX_CONNECTIONS,
+        stale_timeout=DB_STALE_TIMEOUT,
+        timeout=DB_POOL_TIMEOUT
+    )
+else:
+    db = ReconnectingDatabase(
+        DATABASE['name'],
+        user=DATABASE['user'],
+        password=DATABASE['password'],
+        host=DATABASE['host'],
+        port=DATABASE['port']
+    )
+
+
+_inherited_connections = []
+
+
+def _forget_inherited_connections():
+    """Drop the connections a forked process inherited without closing them.
+
+    Closing would end the parent's sessions on the shared sockets; the child
+    opens its own connections on first use instead. Nothing connects on import,
+    so with gunicorn --preload this is only a safeguard.
+    """
+    # Kept referenced: a garbage-collected connection closes itself, and the parent's session with it
+    _inherited_connections.append((db._state.conn, getattr(db, "_connections", None), getattr(db, "_in_use", None)))
+    db._state.reset()
+    if DB_POOL:
+        db._connections = []
+        db._in_use = {}
+        db._pool_lock = threading.RLock()  # May have been held by another thread at fork time
+        db._pool_available = threading.Condition(db._pool_lock)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_inherited_connections)
+
+
+def pool_stats():
+    """Connection pool utilization for this process."""
+    if not DB_POOL:
+        return {"pooled": False, "connected": not db.is_closed()}
+
+    in_use = len(db._in_use)
+    idle = len(db._connections)
+    return {
+        "pooled": True,
+        "max_connections": DB_MAX_CONNECTIONS,
+        "in_use": in_use,
+        "idle": idle,
+        "utilization": round(in_use / DB_MAX_CONNECTIONS, 3) if DB_MAX_CONNECTIONS else None
+    }
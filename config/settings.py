@@ -0,0 +1,88 @@
+"""Library settings (rent amount and overdue fine per day) kept in rent.json.
+
+Reads are served from an in-process cache; the file's identity (inode + mtime)
+is re-checked at most once every SETTINGS_CHECK_INTERVAL seconds and the file is
+only re-parsed when it actually changed, so the issue path does no file I/O in
+steady state. Updates are serialized across workers with an exclusive lock file
+and written to a temp file that is atomically renamed over rent.json, so no
+worker can ever read a half-written file; other workers pick the change up on
+their next check.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS_FILE = os.getenv("SETTINGS_FILE", os.path.join(BASE_DIR, "rent.json"))
+SETTINGS_CHECK_INTERVAL = float(os.getenv("SETTINGS_CHECK_INTERVAL", 2))
+
+DEFAULTS = {"rent_amount": 40, "fine_per_day": 5}
+
+_lock = threading.Lock()
+_values = None
+_version = None  # (inode, mtime_ns) of the file the cache was loaded from
+_checked_at = 0.0
+
+
+def _file_version():
+    try:
+        stat = os.stat(SETTINGS_FILE)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def _read_file():
+    try:
+        with open(SETTINGS_FILE, "r") as f:
+            return {**DEFAULTS, **json.load(f)}
+    except FileNotFoundError:
+        return dict(DEFAULTS)
+
+
+def get_settings():
+    """Return a copy of the current settings."""
+    global _values, _version, _checked_at
+    now = time.monotonic()
+    with _lock:
+        if _values is None or now - _checked_at >= SETTINGS_CHECK_INTERVAL:
+            version = _file_version()
+            if _values is None or version != _version:
+                _values = _read_file()
+                _version = version
+            _checked_at = now
+        return dict(_values)
+
+
+def get_rent():
+    return get_settings()["rent_amount"]
+
+
+def update_settings(**changes):
+    """Merge changes into the settings file atomically and return the new settings."""
+    global _values, _version, _checked_at
+    with open(SETTINGS_FILE + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        values = {**_read_file(), **changes}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(SETTINGS_FILE), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(values, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)  # mkstemp creates files readable by the owner only
+            os.replace(tmp_path, SETTINGS_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with _lock:
+            _values = values
+            _version = _file_version()
+            _checked_at = time.monotonic()
+
+    return dict(values)
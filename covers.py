@@ -0,0 +1,226 @@
+"""Book cover lookup and thumbnail cache.
+
+Covers are resolved on the server by a background job instead of by every
+browser on every page load. The resolver picks ISBNs that have never been
+looked up (or whose retry is due), asks OpenLibrary about a whole batch in one
+``/api/books?bibkeys=...`` request, downloads the covers that exist with at
+most ``COVER_WORKERS`` requests in flight, and stores each as a small WebP
+thumbnail under ``COVER_DIR``. Thumbnails are named after the hash of their
+content, so ``/book/covers/<name>`` can be cached by browsers forever. Books
+without a cover get a tiny SVG placeholder that is gzipped once at startup.
+
+The outcome is recorded per ISBN in ``book_cover``: ``found``, ``missing``
+(looked up again after ``COVER_RECHECK_DAYS``) or ``failed`` (retried with
+exponential backoff). Only run one resolver at a time.
+
+Usage:
+    python covers.py          # resolve new books forever
+    python covers.py --once   # resolve everything that is due and exit
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import url_for
+from peewee import EXCLUDED, fn
+from books_api import HTTP_TIMEOUT, get_session
+from cache import invalidate
+from config.config import db
+from metrics import EXTERNAL_HTTP
+from models import Book, BookCover
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COVER_DIR = os.getenv("COVER_DIR", os.path.join(BASE_DIR, "instance", "covers"))
+OPENLIBRARY_URL = os.getenv("OPENLIBRARY_URL", "https://openlibrary.org")
+COVER_BATCH_SIZE = int(os.getenv("COVER_BATCH_SIZE", 50))  # ISBNs per OpenLibrary metadata request
+COVER_WORKERS = int(os.getenv("COVER_WORKERS", 4))  # Concurrent image downloads
+COVER_POLL_INTERVAL = float(os.getenv("COVER_POLL_INTERVAL", 60))
+COVER_RECHECK_DAYS = int(os.getenv("COVER_RECHECK_DAYS", 30))
+COVER_BACKOFF_SECONDS = int(os.getenv("COVER_BACKOFF_SECONDS", 300))
+COVER_MAX_ATTEMPTS = 8  # Caps the backoff, not the retries
+
+# Twice the 50px list column for high-density screens; 2:3 like a book
+THUMBNAIL_SIZE = (100, 150)
+THUMBNAIL_QUALITY = 75
+COVER_MAX_AGE = 365 * 24 * 3600
+
+PLACEHOLDER_SVG = (
+    b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 150">'
+    b'<rect width="100" height="150" rx="6" fill="#e9ecef"/>'
+    b'<rect x="18" y="14" width="4" height="122" fill="#ced4da"/>'
+    b'<path d="M38 58h44M38 70h44M38 82h30" stroke="#adb5bd" stroke-width="5" stroke-linecap="round"/>'
+    b'</svg>'
+)
+PLACEHOLDER_GZIP = gzip.compress(PLACEHOLDER_SVG, 9, mtime=0)
+PLACEHOLDER_NAME = f"placeholder-{hashlib.sha256(PLACEHOLDER_SVG).hexdigest()[:12]}.svg"
+
+
+def cover_url(thumbnail):
+    """URL of a cover thumbnail, or of the placeholder when there is none."""
+    return url_for('book.cover', name=thumbnail or PLACEHOLDER_NAME)
+
+
+def due_isbns(limit=COVER_BATCH_SIZE):
+    """ISBNs in the catalogue never looked up, then those whose retry is due."""
+    never = (Book
+             .select(Book.isbn)
+             .where(~fn.EXISTS(BookCover.select(BookCover.isbn).where(BookCover.isbn == Book.isbn)))
+             .limit(limit))
+    isbns = [isbn for isbn, in never.tuples()]
+    if len(isbns) < limit:
+        retry = (BookCover
+                 .select(BookCover.isbn)
+                 .join(Book, on=(Book.isbn == BookCover.isbn))
+                 .where((BookCover.status != 'found') & (BookCover.next_attempt <= datetime.now()))
+                 .order_by(BookCover.next_attempt)
+                 .limit(limit - len(isbns)))
+        isbns += [isbn for isbn, in retry.tuples()]
+    return isbns
+
+
+def lookup(isbns, session):
+    """Map each ISBN OpenLibrary has a cover for to the URL of its medium-size image."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = session.get(f"{OPENLIBRARY_URL}/api/books", timeout=HTTP_TIMEOUT, params={
+            "bibkeys": ",".join(f"ISBN:{isbn}" for isbn in isbns), "format": "json"})
+        response.raise_for_status()
+        data = response.json()
+        outcome = "ok"
+    finally:
+        EXTERNAL_HTTP.observe(time.perf_counter() - started, service="openlibrary", outcome=outcome)
+
+    urls = {}
+    for isbn in isbns:
+        thumbnail = (data.get(f"ISBN:{isbn}") or {}).get("thumbnail_url")
+        if thumbnail:
+            # thumbnail_url is the small (-S) image; -M is enough for a sharp 100px thumbnail
+            urls[isbn] = thumbnail.replace("-S.jpg", "-M.jpg")
+    return urls
+
+
+def make_thumbnail(image_bytes):
+    """Resize an image to fit THUMBNAIL_SIZE and encode it as WebP."""
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = image.convert("RGB")
+        image.thumbnail(THUMBNAIL_SIZE)
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=THUMBNAIL_QUALITY, method=6)
+    return out.getvalue()
+
+
+def store_thumbnail(thumbnail):
+    """Write a thumbnail under its content hash and return the file name."""
+    name = f"{hashlib.sha256(thumbnail).hexdigest()[:20]}.webp"
+    path = os.path.join(COVER_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(COVER_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=COVER_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(thumbnail)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    return name
+
+
+def download(url, session):
+    """Fetch one cover and store its thumbnail. Returns the file name, or None if there is no image."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        # default=false: a 404 rather than a blank 1x1 image when OpenLibrary has no cover
+        response = session.get(url, params={"default": "false"}, timeout=HTTP_TIMEOUT)
+        if response.status_code == 404:
+            outcome = "ok"
+            return None
+        response.raise_for_status()
+        outcome = "ok"
+    finally:
+        EXTERNAL_HTTP.observe(time.perf_counter() - started, service="openlibrary", outcome=outcome)
+    return store_thumbnail(make_thumbnail(response.content))
+
+
+def _outcome(isbn, status, attempts, source_url=None, thumbnail=None):
+    now = datetime.now()
+    if status == 'found':
+        next_attempt = None
+    elif status == 'missing':
+        next_attempt = now + timedelta(days=COVER_RECHECK_DAYS)
+    else:
+        next_attempt = now + timedelta(seconds=COVER_BACKOFF_SECONDS * 2 ** min(attempts, COVER_MAX_ATTEMPTS))
+    return {"isbn": isbn, "status": status, "source_url": source_url, "thumbnail": thumbnail,
+            "attempts": attempts + 1, "checked_at": now, "next_attempt": next_attempt}
+
+
+def resolve_batch(isbns, session=None, workers=COVER_WORKERS):
+    """Look up and store the covers of isbns. Returns the number found."""
+    import requests
+    session = session or get_session()
+    attempts = dict(BookCover
+                    .select(BookCover.isbn, BookCover.attempts)
+                    .where(BookCover.isbn.in_(isbns))
+                    .tuples())
+
+    def previous(isbn):
+        return attempts.get(isbn, 0)
+
+    try:
+        urls = lookup(isbns, session)
+    except (requests.RequestException, ValueError):
+        rows = [_outcome(isbn, 'failed', previous(isbn)) for isbn in isbns]
+    else:
+        rows = [_outcome(isbn, 'missing', previous(isbn)) for isbn in isbns if isbn not in urls]
+
+        def fetch(isbn):
+            try:
+                thumbnail = download(urls[isbn], session)
+            except (requests.RequestException, OSError):
+                return _outcome(isbn, 'failed', previous(isbn), urls[isbn])
+            return _outcome(isbn, 'found' if thumbnail else 'missing', previous(isbn), urls[isbn], thumbnail)
+
+        # Downloads run in the pool; the DB write stays on this thread's connection
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            rows += list(executor.map(fetch, urls))
+
+    (BookCover
+     .insert_many(rows)
+     .on_conflict(conflict_target=[BookCover.isbn],
+                  update={field: getattr(EXCLUDED, field.name)
+                          for field in (BookCover.status, BookCover.source_url, BookCover.thumbnail,
+                                        BookCover.attempts, BookCover.checked_at, BookCover.next_attempt)})
+     .execute())
+    found = sum(row["status"] == 'found' for row in rows)
+    if found:
+        invalidate("book")  # Cached book lists still show the placeholder
+    return found
+
+
+def run(batch_size=COVER_BATCH_SIZE, workers=COVER_WORKERS, poll_interval=COVER_POLL_INTERVAL, once=False):
+    session = get_session()
+    while True:
+        with db.connection_context():
+            isbns = due_isbns(batch_size)
+            if isbns:
+                found = resolve_batch(isbns, session, workers)
+                print(f"Covers: {found}/{len(isbns)} found")
+                continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Exit when no lookups are due")
+    parser.add_argument("--batch-size", type=int, default=COVER_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=COVER_WORKERS)
+    args = parser.parse_args()
+
+    run(args.batch_size, args.workers, once=args.once)
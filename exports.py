@@ -0,0 +1,69 @@
+"""Streaming CSV exports.
+
+Rows are read through a PostgreSQL server-side (named) cursor as plain tuples
+and written to the response in chunks as they arrive, so memory use stays flat
+regardless of table size and the first bytes go out immediately. Pass
+``?gzip=1`` to compress the stream on the fly.
+"""
+import csv
+import zlib
+from io import StringIO
+from typing import Callable, Iterable, Iterator, List, Optional
+from flask import Response, request, stream_with_context
+from playhouse.postgres_ext import ServerSide
+from config.config import db
+
+CHUNK_ROWS = 1000  # Rows buffered per chunk written to the client
+CURSOR_ARRAY_SIZE = 2000  # Rows fetched per round trip from the named cursor
+
+
+def server_side_rows(query) -> Iterator[tuple]:
+    """Iterate query as tuples through a named cursor (which must run in a transaction)."""
+    with db.atomic():
+        yield from ServerSide(query.tuples(), array_size=CURSOR_ARRAY_SIZE)
+
+
+def iter_csv(headers: List[str], rows: Iterable) -> Iterator[str]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(query, headers: List[str], filename: str, row_fn: Optional[Callable] = None) -> Response:
+    """Stream query as a CSV attachment, mapping each tuple through row_fn if given."""
+    rows = server_side_rows(query)
+    if row_fn:
+        rows = map(row_fn, rows)
+    chunks = iter_csv(headers, rows)
+
+    if request.args.get("gzip"):
+        body = gzip_chunks(chunks)
+        mimetype = "application/gzip"
+        filename += ".gz"
+    else:
+        body = (chunk.encode("utf-8") for chunk in chunks)
+        mimetype = "text/csv"
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
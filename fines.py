@@ -0,0 +1,96 @@
+"""Server-side overdue fines.
+
+Fines accrue at ``fine_per_day`` (from settings) for every day a loan is past
+its due date. ``accrue_fines()`` brings ``late_days`` and ``fine`` up to date
+for all open overdue loans in a single statement and, in the same statement,
+adds each member's change in accrued fines to ``outstanding_debt`` -- so debt
+always equals the rent plus accrued fines of the member's open loans, and the
+issue path's debt limit takes fines into account. Applying deltas (rather
+than recomputing totals) keeps the job safe to run while books are being
+issued and returned; ``recompute_debts()`` is the full rebuild for repairs.
+Transaction rows are locked before member rows, the same order as
+circulation.py.
+
+Usage:
+    python fines.py               # accrue fines as of today (run nightly from cron)
+    python fines.py --as-of 2025-06-30
+    python fines.py --recompute   # also rebuild every member's outstanding debt
+"""
+import argparse
+from datetime import date, datetime
+from peewee import Value, fn
+from config.config import db
+from config.settings import get_settings
+from cache import invalidate
+from models import Member, Transaction
+
+
+def get_fine_rate():
+    return get_settings()["fine_per_day"]
+
+
+def late_days(as_of, due_date):
+    """SQL expression for whole days between due_date and as_of, never negative."""
+    return fn.GREATEST(0, Value(as_of).cast('date') - due_date)
+
+
+ACCRUE_SQL = """
+WITH overdue AS (
+    SELECT id, fine AS old_fine
+    FROM "transaction"
+    WHERE status = 'issued' AND due_date < %(as_of)s
+    FOR UPDATE
+), accrued AS (
+    UPDATE "transaction" AS t
+    SET late_days = %(as_of)s::date - t.due_date,
+        fine = (%(as_of)s::date - t.due_date) * %(rate)s
+    FROM overdue
+    WHERE t.id = overdue.id AND t.fine IS DISTINCT FROM (%(as_of)s::date - t.due_date) * %(rate)s
+    RETURNING t.member_id, t.fine - overdue.old_fine AS delta
+)
+UPDATE member
+SET outstanding_debt = member.outstanding_debt + changes.delta
+FROM (SELECT member_id, sum(delta) AS delta FROM accrued GROUP BY member_id) AS changes
+WHERE member.id = changes.member_id
+RETURNING member.id
+"""
+
+
+def accrue_fines(as_of=None, rate=None):
+    """Update late days/fines of all open overdue loans as of a date. Returns the number of members charged."""
+    as_of = as_of or date.today()
+    rate = get_fine_rate() if rate is None else rate
+    with db.atomic():
+        cursor = db.execute_sql(ACCRUE_SQL, {'as_of': as_of, 'rate': rate})
+        charged = len(cursor.fetchall())
+    invalidate("transaction", "member")
+    return charged
+
+
+def recompute_debts():
+    """Rebuild every member's outstanding debt from their open loans. Returns the number of members changed."""
+    open_total = (Transaction
+                  .select(fn.COALESCE(fn.SUM(Transaction.rent_fee + Transaction.fine), 0))
+                  .where((Transaction.member == Member.id) & (Transaction.status == 'issued')))
+    with db.atomic():
+        # Hold off issues and returns so no loan changes between summing and writing
+        db.execute_sql('LOCK TABLE "transaction", member IN SHARE ROW EXCLUSIVE MODE')
+        changed = (Member
+                   .update(outstanding_debt=open_total)
+                   .where(Member.outstanding_debt != open_total)
+                   .execute())
+    invalidate("member")
+    return changed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--as-of", type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(), default=None,
+                        help="Accrue fines as of this date (YYYY-MM-DD, default today)")
+    parser.add_argument("--recompute", action="store_true", help="Rebuild all outstanding debts afterwards")
+    args = parser.parse_args()
+
+    with db.connection_context():
+        print(f"Charged fines to {accrue_fines(args.as_of)} member(s)")
+        if args.recompute:
+            print(f"Corrected outstanding debt of {recompute_debts()} member(s)")
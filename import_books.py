@@ -0,0 +1,38 @@
+"""Load a CSV or JSON dump of books into the catalogue offline.
+
+Records use the same keys as the Frappe library API (title, authors, isbn,
+publisher, num_pages, publication_date, language_code). JSON files may hold a
+plain list of records or the API's {"message": [...]} envelope.
+
+Usage:
+    python import_books.py books.csv
+    python import_books.py books.json --batch-size 1000
+"""
+import argparse
+import csv
+import json
+import os
+from books_api import IMPORT_BATCH_SIZE, save_books_to_db
+from cache import invalidate
+
+
+def read_records(path):
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("message", []) if isinstance(data, dict) else data
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk import books from a CSV or JSON dump.")
+    parser.add_argument("path", help="CSV or JSON file to import")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    report = save_books_to_db(read_records(args.path), batch_size=args.batch_size)
+    invalidate("book")
+    print(f"Inserted: {report['inserted']}  Updated: {report['updated']}  Rejected: {report['rejected']}")
+    print(f"Took {report['seconds']}s ({report['books_per_second']} books/s)")
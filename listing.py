@@ -0,0 +1,195 @@
+"""Server-side search, filtering, sorting and keyset pagination for the list pages.
+
+Each ``*_page`` function takes the request query args and returns a ``Page``
+holding at most ``page_size`` rows plus an opaque cursor for the next page.
+Pages are fetched with ``WHERE (sort_key, id) > (last_sort_key, last_id)``
+instead of OFFSET, so the cost of any page is bounded by the page size.
+"""
+import base64
+import json
+import os
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional
+from flask import request, url_for
+from peewee import CharField, DateField, FloatField, IntegerField, TextField, Tuple
+from config.config import db
+from models import Book, Member, Transaction, TransactionArchive
+from queries import books_with_covers, members_with_activity, transactions_with_parties
+from search import build_tsquery, matching
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 500))
+FILTER_OPTIONS = int(os.getenv("FILTER_OPTIONS", 50))  # Most common values offered per filter dropdown
+
+BOOK_SORTS = {'title': Book.title, 'author': Book.author, 'stock': Book.stock, 'id': Book.id}
+MEMBER_SORTS = {'first_name': Member.first_name, 'last_name': Member.last_name, 'member_id': Member.member_id, 'id': Member.id}
+TRANSACTION_SORTS = {'id': Transaction.id, 'issue_date': Transaction.issue_date, 'due_date': Transaction.due_date}
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+    page_size: int
+    sort: str
+    order: str
+
+
+def encode_cursor(sort: str, order: str, values: List[Any]) -> str:
+    values = [v.isoformat() if isinstance(v, date) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps([sort, order, *values]).encode()).decode()
+
+
+def _key_value(field, value):
+    """value converted for comparison with field, raising ValueError if it can't be one of its values."""
+    if isinstance(field, DateField) and isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(field, IntegerField) and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(field, FloatField) and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(field, (CharField, TextField)) and isinstance(value, str) and "\0" not in value:
+        return value
+    raise ValueError(f"Invalid cursor value for {field.name}")
+
+
+def decode_cursor(cursor: Optional[str], sort: str, order: str, keys: List[Any]) -> Optional[List[Any]]:
+    """Key values the next page starts after; None (first page) if malformed or from another sort or order."""
+    if not cursor:
+        return None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(state, list) or len(state) != 4 or state[:2] != [sort, order]:
+        return None
+    values = state[3:] if len(keys) == 1 else state[2:]
+    try:
+        return [_key_value(key, value) for key, value in zip(keys, values)]
+    except ValueError:
+        return None
+
+
+def get_page_size(args) -> int:
+    try:
+        size = int(args.get('page_size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate(query, args, sorts: Dict[str, Any], default_sort: str, id_field, default_order: str = 'asc') -> Page:
+    """Apply sort, cursor and limit to query and fetch a single page."""
+    sort = args.get('sort') if args.get('sort') in sorts else default_sort
+    order = args.get('order') if args.get('order') in ('asc', 'desc') else default_order
+    page_size = get_page_size(args)
+    sort_field = sorts[sort]
+
+    # When sorting by the primary key itself the key is just (id,)
+    keys = [id_field] if sort_field is id_field else [sort_field, id_field]
+    values = decode_cursor(args.get('cursor'), sort, order, keys)
+    if values:
+        if order == 'desc':
+            query = query.where(Tuple(*keys) < Tuple(*values))
+        else:
+            query = query.where(Tuple(*keys) > Tuple(*values))
+
+    ordering = [k.desc() for k in keys] if order == 'desc' else [k.asc() for k in keys]
+    rows = list(query.order_by(*ordering).limit(page_size + 1))
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, order, [getattr(last, sort_field.name), last.id])
+
+    return Page(rows, next_cursor, page_size, sort, order)
+
+
+def next_page_url(page: Page) -> Optional[str]:
+    """URL of the page after this one, keeping the current filters."""
+    if not page.next_cursor:
+        return None
+    args = request.args.to_dict()
+    args['cursor'] = page.next_cursor
+    return url_for(request.endpoint, **request.view_args, **args)
+
+
+def first_page_url() -> Optional[str]:
+    """URL of the first page with the current filters, or None when already on it."""
+    if 'cursor' not in request.args:
+        return None
+    args = request.args.to_dict()
+    del args['cursor']
+    return url_for(request.endpoint, **request.view_args, **args)
+
+
+def book_page(args) -> Page:
+    query = books_with_covers()
+
+    # Full-text match on title, ISBN, author and publisher (see search.py)
+    tsquery = build_tsquery(args.get('q', ''))
+    if tsquery:
+        query = query.where(matching(tsquery))
+    if args.get('language'):
+        query = query.where(Book.language == args['language'])
+    if args.get('publisher'):
+        query = query.where(Book.publisher == args['publisher'])
+    if args.get('in_stock'):
+        query = query.where(Book.stock > 0)
+
+    return paginate(query, args, BOOK_SORTS, 'title', Book.id)
+
+
+def member_page(args) -> Page:
+    query = members_with_activity()
+
+    search = args.get('q', '').strip()
+    if search:
+        query = query.where(Member.first_name.contains(search) | Member.last_name.contains(search) |
+                            Member.member_id.contains(search) | Member.email.contains(search) |
+                            Member.phone.contains(search))
+    if args.get('city'):
+        query = query.where(Member.city == args['city'])
+    if args.get('state'):
+        query = query.where(Member.state == args['state'])
+
+    return paginate(query, args, MEMBER_SORTS, 'id', Member.id)
+
+
+def transaction_model(args):
+    """The table a transaction listing reads: the archive (see archive.py) for ?status=archived."""
+    return TransactionArchive if args.get('status') == 'archived' else Transaction
+
+
+def transaction_page(args) -> Page:
+    model = transaction_model(args)
+    query = transactions_with_parties(model)
+
+    search = args.get('q', '').strip()
+    if search:
+        query = query.where(Member.first_name.contains(search) | Member.last_name.contains(search) |
+                            Book.title.contains(search) | model.invoice_id.contains(search))
+    if args.get('status') == 'overdue':
+        query = query.where((model.status == 'issued') & (model.due_date < date.today()))
+    elif args.get('status') and model is Transaction:
+        query = query.where(model.status == args['status'])
+    if args.get('member_id'):
+        query = query.where(Member.member_id == args['member_id'])
+
+    sorts = {name: getattr(model, field.name) for name, field in TRANSACTION_SORTS.items()}
+    return paginate(query, args, sorts, 'id', model.id, default_order='desc')
+
+
+def filter_options(field, selected: Optional[str] = None) -> List[Any]:
+    """The FILTER_OPTIONS most common values of a column, sorted, for a filter dropdown.
+
+    Read from the ``filter_option`` materialized view (migration 011, refreshed
+    by stats.py), so values added since the last refresh are missing until the
+    next one. The selected value is always included, so the dropdown shows it.
+    """
+    cursor = db.execute_sql("SELECT value FROM filter_option WHERE name = %s ORDER BY count DESC, value LIMIT %s",
+                            (f"{field.model._meta.table_name}.{field.column_name}", FILTER_OPTIONS))
+    values = [row[0] for row in cursor.fetchall() if row[0] is not None]
+    if selected and selected not in values:
+        values.append(selected)
+    return sorted(values)
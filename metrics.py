@@ -0,0 +1,192 @@
+"""Request, database, outbound HTTP and PDF instrumentation.
+
+``init_app(app)`` times every request into a latency histogram labelled by
+blueprint, endpoint, method and status, and counts the SQL statements each
+request runs. Every statement's duration is recorded through the query hook
+in config/config.py; statements slower than ``SLOW_QUERY_MS`` and requests
+slower than ``SLOW_REQUEST_MS`` are also written to the ``lms.slow`` log.
+books_api.py and pdf_render.py time their library/ARN API calls and
+WeasyPrint renders with ``EXTERNAL_HTTP`` and ``PDF_RENDER``.
+
+``GET /metrics`` returns everything in the Prometheus text format, together
+with the connection pool and response cache gauges. Metrics are kept per
+worker process (like the pool itself), so scrape each worker or run one
+worker per scrape target.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from flask import g, has_request_context, request
+from cache import LocalBackend, get_backend
+from config.config import pool_stats, query_hooks
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 1000))
+SLOW_LOG_MAX_CHARS = 1000  # Bulk statements can carry thousands of parameters
+
+# Seconds; covers cached hits (sub-millisecond) up to batch PDF jobs
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+slow_log = logging.getLogger("lms.slow")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values: Dict[tuple, list] = {}  # key -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {counts[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {counts[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {counts[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("lms_http_request_duration_seconds", "Time to handle a request.",
+                            ("blueprint", "endpoint", "method", "status"))
+REQUEST_QUERIES = Histogram("lms_http_request_queries", "SQL statements run per request.",
+                            ("endpoint",), buckets=COUNT_BUCKETS)
+DB_QUERY = Histogram("lms_db_query_duration_seconds", "Time to execute one SQL statement.", ("endpoint",))
+SLOW_QUERIES = Counter("lms_db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS.", ("endpoint",))
+EXTERNAL_HTTP = Histogram("lms_external_http_duration_seconds", "Outbound API calls (books, ARN).",
+                          ("service", "outcome"))
+PDF_RENDER = Histogram("lms_pdf_render_duration_seconds", "WeasyPrint render time in the PDF pool.", ("mode",))
+PDF_CACHE = Counter("lms_pdf_cache_total", "PDF disk cache lookups.", ("result",))
+
+REGISTRY = [REQUEST_LATENCY, REQUEST_QUERIES, DB_QUERY, SLOW_QUERIES, EXTERNAL_HTTP, PDF_RENDER, PDF_CACHE]
+
+
+def _endpoint():
+    if not has_request_context():
+        return "none"
+    return request.endpoint or "unmatched"
+
+
+def record_query(sql, params, seconds):
+    """Query hook (config.config.query_hooks): time, count and slow-log one statement."""
+    endpoint = _endpoint()
+    DB_QUERY.observe(seconds, endpoint=endpoint)
+    if has_request_context() and "query_count" in g:
+        g.query_count += 1
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(endpoint=endpoint)
+        slow_log.warning("slow query (%.0f ms, %s): %s %s", seconds * 1000, endpoint,
+                         sql[:SLOW_LOG_MAX_CHARS], repr(params)[:SLOW_LOG_MAX_CHARS])
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+    g.query_count = 0
+
+
+def _observe_request(status):
+    elapsed = time.perf_counter() - g.pop("request_started")
+    endpoint = request.endpoint or "unmatched"
+    REQUEST_LATENCY.observe(elapsed, blueprint=request.blueprint or "app", endpoint=endpoint,
+                            method=request.method, status=status)
+    REQUEST_QUERIES.observe(g.query_count, endpoint=endpoint)
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        slow_log.warning("slow request (%.0f ms, %d queries): %s %s",
+                         elapsed * 1000, g.query_count, request.method, request.full_path)
+
+
+def _record_request(response):
+    if "request_started" in g:
+        _observe_request(response.status_code)
+    return response
+
+
+def _record_failed_request(exc):
+    # Requests that never produced a response (e.g. an error while handling an error)
+    if exc is not None and "request_started" in g:
+        _observe_request(500)
+
+
+def init_app(app):
+    """Register the timing hooks; call before any other before_request hook."""
+    if record_query not in query_hooks:
+        query_hooks.append(record_query)
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.teardown_request(_record_failed_request)
+
+
+def _gauges():
+    lines = []
+    pool = pool_stats()
+    if pool["pooled"]:
+        for name in ("max_connections", "in_use", "idle"):
+            lines += [f"# TYPE lms_db_pool_{name} gauge", f"lms_db_pool_{name} {pool[name]}"]
+
+    backend = get_backend()
+    if isinstance(backend, LocalBackend):
+        lines += ["# TYPE lms_response_cache_hits_total counter",
+                  f"lms_response_cache_hits_total {backend.values.hits}",
+                  "# TYPE lms_response_cache_misses_total counter",
+                  f"lms_response_cache_misses_total {backend.values.misses}"]
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += _gauges()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,54 @@
+"""Database schema migrations (peewee-migrate).
+
+The schema is no longer created when models.py is imported; run this once per
+deploy instead, before starting the web workers.
+
+Usage:
+    python migrate.py                    # apply pending migrations
+    python migrate.py list               # show applied and pending migrations
+    python migrate.py create <name>      # new empty migration
+    python migrate.py create <name> --auto   # migration diffed from models.py
+    python migrate.py rollback           # undo the latest migration
+"""
+import argparse
+import os
+from peewee_migrate import Router
+from config.config import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def get_router():
+    return Router(db, migrate_dir=MIGRATIONS_DIR, ignore=["basemodel"])
+
+
+def migrate():
+    """Apply all pending migrations and return their names."""
+    return get_router().run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage database migrations.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("up", help="Apply pending migrations (default)")
+    subparsers.add_parser("list", help="List applied and pending migrations")
+    subparsers.add_parser("rollback", help="Undo the latest migration")
+    create_parser = subparsers.add_parser("create", help="Create a new migration")
+    create_parser.add_argument("name")
+    create_parser.add_argument("--auto", action="store_true", help="Generate operations from models.py")
+    args = parser.parse_args()
+
+    router = get_router()
+    with db.connection_context():
+        if args.command == "list":
+            for name in router.done:
+                print(f"[x] {name}")
+            for name in router.diff:
+                print(f"[ ] {name}")
+        elif args.command == "rollback":
+            router.rollback()
+        elif args.command == "create":
+            router.create(args.name, auto="models" if args.auto else False)
+        else:
+            applied = router.run()
+            print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
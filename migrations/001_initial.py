@@ -0,0 +1,83 @@
+"""Peewee migrations -- 001_initial.
+
+Baseline schema as it was created by ``db.create_tables(..., safe=True)``.
+create_model() creates tables with IF NOT EXISTS, so this is a no-op on
+databases that predate the migration pipeline.
+"""
+
+import datetime as dt
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    @migrator.create_model
+    class Book(pw.Model):
+        id = pw.AutoField()
+        title = pw.CharField(max_length=255)
+        author = pw.CharField(max_length=255)
+        isbn = pw.CharField(max_length=255, unique=True)
+        publisher = pw.CharField(max_length=255)
+        stock = pw.IntegerField(default=5)
+        num_pages = pw.IntegerField()
+        publication_date = pw.IntegerField()
+        language = pw.CharField(default='English', max_length=255)
+        mrp = pw.FloatField()
+        times_issued = pw.IntegerField(default=0)
+
+        class Meta:
+            table_name = "book"
+
+    @migrator.create_model
+    class Member(pw.Model):
+        id = pw.AutoField()
+        first_name = pw.CharField(max_length=255)
+        last_name = pw.CharField(max_length=255)
+        member_id = pw.CharField(max_length=255, unique=True)
+        email = pw.CharField(max_length=255, unique=True)
+        phone = pw.CharField(max_length=255)
+        locality = pw.TextField()
+        city = pw.CharField(max_length=255)
+        state = pw.CharField(max_length=255)
+        pincode = pw.CharField(max_length=255)
+        dob = pw.DateField()
+        age = pw.IntegerField()
+        gender = pw.CharField(max_length=255)
+        outstanding_debt = pw.FloatField(default=0.0)
+        last_active = pw.DateField(null=True)
+        card_status = pw.CharField(max_length=255)
+        card_expiry = pw.DateField(null=True)
+
+        class Meta:
+            table_name = "member"
+
+    @migrator.create_model
+    class Transaction(pw.Model):
+        id = pw.AutoField()
+        member = pw.ForeignKeyField(column_name='member_id', field='id', model=migrator.orm['member'], backref='transactions')
+        book = pw.ForeignKeyField(column_name='book_id', field='id', model=migrator.orm['book'], backref='transactions')
+        issue_date = pw.DateField(default=dt.date.today)
+        due_date = pw.DateField()
+        return_date = pw.DateField(null=True)
+        rent_fee = pw.FloatField(default=0)
+        fine = pw.FloatField(default=0)
+        status = pw.CharField(max_length=255)
+        late_days = pw.IntegerField(default=0)
+        mode_of_payment = pw.CharField(max_length=255, null=True)
+        invoice_id = pw.CharField(max_length=255, null=True, unique=True)
+
+        class Meta:
+            table_name = "transaction"
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.remove_model('transaction')
+
+    migrator.remove_model('member')
+
+    migrator.remove_model('book')
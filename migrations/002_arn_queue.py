@@ -0,0 +1,30 @@
+"""Peewee migrations -- 002_arn_queue.
+
+Work-queue columns drained by arn_worker.py. Written as raw SQL with
+IF NOT EXISTS because databases created by the old import-time
+create_tables() may already have them.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    migrator.sql("""ALTER TABLE "transaction"
+        ADD COLUMN IF NOT EXISTS arn_status VARCHAR(255) NOT NULL DEFAULT 'pending',
+        ADD COLUMN IF NOT EXISTS arn_attempts INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS arn_next_attempt TIMESTAMP NOT NULL DEFAULT now()""")
+
+    # Rows that already have an invoice are finished
+    migrator.sql("""UPDATE "transaction" SET arn_status = 'done' WHERE invoice_id IS NOT NULL""")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("""ALTER TABLE "transaction"
+        DROP COLUMN IF EXISTS arn_status,
+        DROP COLUMN IF EXISTS arn_attempts,
+        DROP COLUMN IF EXISTS arn_next_attempt""")
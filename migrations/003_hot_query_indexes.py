@@ -0,0 +1,35 @@
+"""Peewee migrations -- 003_hot_query_indexes.
+
+Indexes for the columns the list pages, circulation and the ARN worker filter
+on. Foreign keys (transaction.member_id / book_id) are already indexed by
+create_table().
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+INDEXES = {
+    # Status filter on the transaction list and open-loan lookups per member
+    "transaction_status": """ON "transaction" (status)""",
+    "transaction_member_id_status": """ON "transaction" (member_id, status)""",
+    # ARN worker claim query: due, un-invoiced rows in attempt order
+    "transaction_uninvoiced": """ON "transaction" (arn_next_attempt) WHERE invoice_id IS NULL""",
+    # Book list filters and the in-stock picker on the issue form
+    "book_language": """ON book (language)""",
+    "book_publisher": """ON book (publisher)""",
+    "book_in_stock": """ON book (title, id) WHERE stock > 0""",
+}
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    for name, definition in INDEXES.items():
+        migrator.sql(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    for name in INDEXES:
+        migrator.sql(f"DROP INDEX IF EXISTS {name}")
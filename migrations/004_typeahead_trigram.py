@@ -0,0 +1,30 @@
+"""Peewee migrations -- 004_typeahead_trigram.
+
+Trigram indexes backing the issue-form typeahead (typeahead.py). Each index is
+on the same lower-cased search text expression the queries filter on, so
+substring matches (``LIKE '%q%'``) on any of the concatenated fields are
+answered from the index.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+INDEXES = {
+    "member_search_trgm": """ON member USING gin (lower(first_name || ' ' || last_name || ' ' || member_id || ' ' || phone || ' ' || email) gin_trgm_ops)""",
+    "book_search_trgm": """ON book USING gin (lower(title || ' ' || author || ' ' || isbn) gin_trgm_ops)""",
+}
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    migrator.sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, definition in INDEXES.items():
+        migrator.sql(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    for name in INDEXES:
+        migrator.sql(f"DROP INDEX IF EXISTS {name}")
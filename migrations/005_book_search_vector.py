@@ -0,0 +1,48 @@
+"""Peewee migrations -- 005_book_search_vector.
+
+Full-text search over the catalogue (search.py). ``book.search_vector`` is
+maintained by a trigger rather than by the application, so bulk imports and
+raw SQL updates keep it current too, and it is deliberately not a field on
+the Book model so ordinary queries never fetch it. Title and ISBN weigh most,
+then author, then publisher. The 'simple' configuration is used because the
+catalogue is multilingual and English stemming would mangle other languages.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.isbn, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.author, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(NEW.publisher, '')), 'C')
+"""
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    migrator.sql("ALTER TABLE book ADD COLUMN IF NOT EXISTS search_vector tsvector")
+    migrator.sql(f"""CREATE OR REPLACE FUNCTION book_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql""")
+    migrator.sql("DROP TRIGGER IF EXISTS book_search_vector_trigger ON book")
+    migrator.sql("""CREATE TRIGGER book_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, isbn, author, publisher ON book
+        FOR EACH ROW EXECUTE FUNCTION book_search_vector_update()""")
+
+    # Backfill existing rows
+    migrator.sql(f"UPDATE book SET search_vector = {SEARCH_VECTOR_SQL.replace('NEW.', '')}")
+    migrator.sql("CREATE INDEX IF NOT EXISTS book_search_vector ON book USING gin (search_vector)")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP TRIGGER IF EXISTS book_search_vector_trigger ON book")
+    migrator.sql("DROP FUNCTION IF EXISTS book_search_vector_update()")
+    migrator.sql("DROP INDEX IF EXISTS book_search_vector")
+    migrator.sql("ALTER TABLE book DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,65 @@
+"""Peewee migrations -- 006_stats.
+
+Dashboard statistics (stats.py): the sharded per-day circulation counters,
+the ``library_stats`` materialized view of catalogue/member/loan totals, and
+an index for the most-issued books. Counters and ``book.times_issued`` (which
+was never incremented before) are backfilled from existing transactions.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+STATS_SHARDS = 16  # Must match stats.STATS_SHARDS
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    @migrator.create_model
+    class CirculationCounter(pw.Model):
+        day = pw.DateField()
+        shard = pw.IntegerField()
+        issued = pw.IntegerField(default=0)
+        returned = pw.IntegerField(default=0)
+
+        class Meta:
+            table_name = "circulation_counter"
+            primary_key = pw.CompositeKey('day', 'shard')
+
+    migrator.sql(f"""INSERT INTO circulation_counter (day, shard, issued, returned)
+        SELECT day, shard, sum(issued), sum(returned) FROM (
+            SELECT issue_date AS day, mod(book_id, {STATS_SHARDS}) AS shard, 1 AS issued, 0 AS returned
+            FROM "transaction"
+            UNION ALL
+            SELECT return_date, mod(book_id, {STATS_SHARDS}), 0, 1
+            FROM "transaction" WHERE status = 'returned' AND return_date IS NOT NULL
+        ) AS events
+        GROUP BY day, shard
+        ON CONFLICT (day, shard) DO NOTHING""")
+
+    migrator.sql("""UPDATE book SET times_issued = issues.count
+        FROM (SELECT book_id, count(*) AS count FROM "transaction" GROUP BY book_id) AS issues
+        WHERE book.id = issues.book_id""")
+    migrator.sql("CREATE INDEX IF NOT EXISTS book_times_issued ON book (times_issued DESC, id)")
+
+    migrator.sql("""CREATE MATERIALIZED VIEW IF NOT EXISTS library_stats AS
+        SELECT
+            1 AS id,
+            (SELECT count(*) FROM book) AS titles,
+            (SELECT coalesce(sum(stock), 0) FROM book) AS copies_in_stock,
+            (SELECT count(*) FROM member) AS members,
+            (SELECT count(*) FROM member WHERE card_status = 'Active') AS active_members,
+            (SELECT count(*) FROM "transaction" WHERE status = 'issued') AS open_loans,
+            (SELECT count(*) FROM "transaction" WHERE status = 'issued' AND due_date < current_date) AS overdue_loans,
+            (SELECT coalesce(sum(outstanding_debt), 0) FROM member) AS outstanding_debt,
+            now() AS refreshed_at""")
+    # A unique index lets REFRESH ... CONCURRENTLY run without blocking readers
+    migrator.sql("CREATE UNIQUE INDEX IF NOT EXISTS library_stats_id ON library_stats (id)")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP MATERIALIZED VIEW IF EXISTS library_stats")
+    migrator.sql("DROP INDEX IF EXISTS book_times_issued")
+    migrator.remove_model('circulation_counter')
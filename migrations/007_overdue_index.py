@@ -0,0 +1,20 @@
+"""Peewee migrations -- 007_overdue_index.
+
+Partial index for open loans by due date: the fine engine (fines.py) and the
+overdue filter on the transaction list read only issued, past-due rows.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    migrator.sql("""CREATE INDEX IF NOT EXISTS transaction_open_due_date ON "transaction" (due_date) WHERE status = 'issued'""")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP INDEX IF EXISTS transaction_open_due_date")
@@ -0,0 +1,35 @@
+"""Peewee migrations -- 008_book_covers.
+
+Cover lookups by ISBN (covers.py): one row per ISBN that has been looked up,
+with the locally stored thumbnail's file name when a cover was found. Keyed on
+ISBN rather than book id, so deleting and re-importing a book doesn't look its
+cover up again. The partial index serves the resolver's retry scan.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    @migrator.create_model
+    class BookCover(pw.Model):
+        isbn = pw.CharField(max_length=255, primary_key=True)
+        status = pw.CharField(max_length=255)
+        source_url = pw.CharField(max_length=255, null=True)
+        thumbnail = pw.CharField(max_length=255, null=True)
+        attempts = pw.IntegerField(default=0)
+        checked_at = pw.DateTimeField()
+        next_attempt = pw.DateTimeField(null=True)
+
+        class Meta:
+            table_name = "book_cover"
+
+    migrator.sql("CREATE INDEX IF NOT EXISTS book_cover_retry ON book_cover (next_attempt) WHERE status <> 'found'")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.remove_model('book_cover')
@@ -0,0 +1,79 @@
+"""Peewee migrations -- 009_sync_tracking.
+
+Change tracking for the incremental sync endpoints (sync.py). ``book``,
+``member`` and ``transaction`` get ``updated_at`` and ``change_id``, set by a
+trigger on every insert and on every update that changes the row -- including
+bulk UPDATEs and raw SQL, as with ``book.search_vector`` -- to the time and to
+the id of the writing transaction (``txid_current()``). Deletes are recorded
+in ``sync_tombstone`` by a statement-level trigger, one INSERT per DELETE
+statement however many rows it removes.
+
+Existing rows get change_id 0 and the migration time; the columns are added
+with defaults so the tables are not rewritten.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+TABLES = ("book", "member", "transaction")
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    migrator.sql("""CREATE TABLE IF NOT EXISTS sync_tombstone (
+        table_name varchar(255) NOT NULL,
+        row_id integer NOT NULL,
+        change_id bigint NOT NULL,
+        deleted_at timestamp with time zone NOT NULL DEFAULT now(),
+        PRIMARY KEY (table_name, row_id))""")
+    migrator.sql("CREATE INDEX IF NOT EXISTS sync_tombstone_change ON sync_tombstone (table_name, change_id, row_id)")
+    migrator.sql("CREATE INDEX IF NOT EXISTS sync_tombstone_deleted_at ON sync_tombstone (deleted_at)")
+
+    migrator.sql("""CREATE OR REPLACE FUNCTION sync_row_changed() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            NEW.change_id := txid_current();
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql""")
+    migrator.sql("""CREATE OR REPLACE FUNCTION sync_rows_deleted() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO sync_tombstone (table_name, row_id, change_id, deleted_at)
+            SELECT TG_TABLE_NAME, id, txid_current(), now() FROM deleted_rows
+            ON CONFLICT (table_name, row_id) DO UPDATE
+                SET change_id = EXCLUDED.change_id, deleted_at = EXCLUDED.deleted_at;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql""")
+
+    for table in TABLES:
+        migrator.sql(f"""ALTER TABLE "{table}"
+            ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone NOT NULL DEFAULT now(),
+            ADD COLUMN IF NOT EXISTS change_id bigint NOT NULL DEFAULT 0""")
+        migrator.sql(f'CREATE INDEX IF NOT EXISTS {table}_change ON "{table}" (change_id, id)')
+
+        migrator.sql(f'DROP TRIGGER IF EXISTS {table}_sync_inserted ON "{table}"')
+        migrator.sql(f"""CREATE TRIGGER {table}_sync_inserted BEFORE INSERT ON "{table}"
+            FOR EACH ROW EXECUTE FUNCTION sync_row_changed()""")
+        # Updates that leave the row as it was (e.g. model.save() without changes) are not changes
+        migrator.sql(f'DROP TRIGGER IF EXISTS {table}_sync_updated ON "{table}"')
+        migrator.sql(f"""CREATE TRIGGER {table}_sync_updated BEFORE UPDATE ON "{table}"
+            FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION sync_row_changed()""")
+        migrator.sql(f'DROP TRIGGER IF EXISTS {table}_sync_deleted ON "{table}"')
+        migrator.sql(f"""CREATE TRIGGER {table}_sync_deleted AFTER DELETE ON "{table}"
+            REFERENCING OLD TABLE AS deleted_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sync_rows_deleted()""")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    for table in TABLES:
+        for trigger in ("inserted", "updated", "deleted"):
+            migrator.sql(f'DROP TRIGGER IF EXISTS {table}_sync_{trigger} ON "{table}"')
+        migrator.sql(f"DROP INDEX IF EXISTS {table}_change")
+        migrator.sql(f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS updated_at, DROP COLUMN IF EXISTS change_id')
+    migrator.sql("DROP FUNCTION IF EXISTS sync_row_changed()")
+    migrator.sql("DROP FUNCTION IF EXISTS sync_rows_deleted()")
+    migrator.sql("DROP TABLE IF EXISTS sync_tombstone")
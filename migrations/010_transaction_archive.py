@@ -0,0 +1,71 @@
+"""Peewee migrations -- 010_transaction_archive.
+
+Settled loans are moved out of ``transaction`` into ``transaction_archive``
+by archive.py, so the table the circulation desk, the ARN worker and the fine
+job work on -- and its indexes -- stay the size of the working set however
+long the library's history grows.
+
+The archive has the same columns and keeps the ids, so receipt links stay
+valid. archive.py moves rows with ``lms.skip_tombstones`` set for the
+transaction, which the sync delete trigger (migration 009) now honours:
+archiving is not a delete to /transaction/changes clients. Deleting a row from
+the archive does leave a tombstone, under ``transaction``.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+# Columns of "transaction" (and so of the archive) as of this migration
+COLUMNS = ", ".join(f'"{column}"' for column in (
+    "id", "updated_at", "change_id", "member_id", "book_id", "issue_date", "due_date", "return_date", "rent_fee",
+    "fine", "status", "late_days", "mode_of_payment", "invoice_id", "arn_status", "arn_attempts", "arn_next_attempt"))
+
+SYNC_ROWS_DELETED = """CREATE OR REPLACE FUNCTION sync_rows_deleted() RETURNS trigger AS $$
+        BEGIN
+            {skip}INSERT INTO sync_tombstone (table_name, row_id, change_id, deleted_at)
+            SELECT {table_name}, id, txid_current(), now() FROM deleted_rows
+            ON CONFLICT (table_name, row_id) DO UPDATE
+                SET change_id = EXCLUDED.change_id, deleted_at = EXCLUDED.deleted_at;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql"""
+
+SKIP_TOMBSTONES = """IF current_setting('lms.skip_tombstones', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            """
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    migrator.sql("""CREATE TABLE IF NOT EXISTS transaction_archive (
+        LIKE "transaction",
+        PRIMARY KEY (id),
+        FOREIGN KEY (member_id) REFERENCES member (id),
+        FOREIGN KEY (book_id) REFERENCES book (id))""")
+    migrator.sql("CREATE INDEX IF NOT EXISTS transaction_archive_member_id ON transaction_archive (member_id)")
+    migrator.sql("CREATE INDEX IF NOT EXISTS transaction_archive_book_id ON transaction_archive (book_id)")
+    migrator.sql("CREATE INDEX IF NOT EXISTS transaction_archive_issue_date ON transaction_archive (issue_date)")
+    migrator.sql("CREATE UNIQUE INDEX IF NOT EXISTS transaction_archive_invoice_id ON transaction_archive (invoice_id)")
+
+    # Mover: returned loans in return-date order
+    migrator.sql("""CREATE INDEX IF NOT EXISTS transaction_returned ON "transaction" (return_date)
+        WHERE status = 'returned'""")
+
+    # A trigger argument names the table tombstones are recorded under (default: the trigger's own)
+    migrator.sql(SYNC_ROWS_DELETED.format(skip=SKIP_TOMBSTONES, table_name="coalesce(TG_ARGV[0], TG_TABLE_NAME)"))
+    migrator.sql('DROP TRIGGER IF EXISTS transaction_archive_sync_deleted ON transaction_archive')
+    migrator.sql("""CREATE TRIGGER transaction_archive_sync_deleted AFTER DELETE ON transaction_archive
+        REFERENCING OLD TABLE AS deleted_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION sync_rows_deleted('transaction')""")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    # Archived loans go back to the working table first, by name: the column order of the two tables may differ
+    migrator.sql(f"""INSERT INTO "transaction" ({COLUMNS}) SELECT {COLUMNS} FROM transaction_archive""")
+    migrator.sql("DROP TABLE IF EXISTS transaction_archive")
+    migrator.sql("DROP INDEX IF EXISTS transaction_returned")
+    migrator.sql(SYNC_ROWS_DELETED.format(skip="", table_name="TG_TABLE_NAME"))
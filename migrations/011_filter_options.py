@@ -0,0 +1,33 @@
+"""Peewee migrations -- 011_filter_options.
+
+The ``filter_option`` materialized view: how many books and members have each
+language, publisher, city and state, for the list pages' filter dropdowns
+(listing.filter_options). It is refreshed with ``library_stats`` by stats.py,
+so rendering a list page never groups the whole book or member table.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    migrator.sql("""CREATE MATERIALIZED VIEW IF NOT EXISTS filter_option AS
+        SELECT 'book.language' AS name, language AS value, count(*) AS count FROM book GROUP BY language
+        UNION ALL
+        SELECT 'book.publisher', publisher, count(*) FROM book GROUP BY publisher
+        UNION ALL
+        SELECT 'member.city', city, count(*) FROM member GROUP BY city
+        UNION ALL
+        SELECT 'member.state', state, count(*) FROM member GROUP BY state""")
+    # Unique so REFRESH ... CONCURRENTLY can run without blocking readers
+    migrator.sql("CREATE UNIQUE INDEX IF NOT EXISTS filter_option_name_value ON filter_option (name, value)")
+    # Dropdowns read the most common values of one column
+    migrator.sql("CREATE INDEX IF NOT EXISTS filter_option_name_count ON filter_option (name, count DESC, value)")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    migrator.sql("DROP MATERIALIZED VIEW IF EXISTS filter_option")
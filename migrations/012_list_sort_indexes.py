@@ -0,0 +1,34 @@
+"""Peewee migrations -- 012_list_sort_indexes.
+
+Indexes on the (sort key, id) pairs the list pages paginate on (listing.py),
+so the first and every later page of an unfiltered list is a short index
+range scan instead of a sort of the whole table. Sorting by id uses the
+primary key.
+"""
+
+import peewee as pw
+from peewee_migrate import Migrator
+
+INDEXES = {
+    "book_title_id": """ON book (title, id)""",
+    "book_author_id": """ON book (author, id)""",
+    "book_stock_id": """ON book (stock, id)""",
+    "member_first_name_id": """ON member (first_name, id)""",
+    "member_last_name_id": """ON member (last_name, id)""",
+    "transaction_issue_date_id": """ON "transaction" (issue_date, id)""",
+    "transaction_due_date_id": """ON "transaction" (due_date, id)""",
+}
+
+
+def migrate(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your migrations here."""
+
+    for name, definition in INDEXES.items():
+        migrator.sql(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+
+def rollback(migrator: Migrator, database: pw.Database, *, fake=False):
+    """Write your rollback migrations here."""
+
+    for name in INDEXES:
+        migrator.sql(f"DROP INDEX IF EXISTS {name}")
@@ -1,12 +1,19 @@
 from peewee import *
 from config.config import db
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+
+CARD_VALIDITY_DAYS = 730  # Library cards expire this long after joining
 
 class BaseModel(Model):
     class Meta:
         database = db
 
-class Book(BaseModel):
+class SyncedModel(BaseModel):
+    # Both set by trigger on insert and on any update that changes the row (migration 009, sync.py)
+    updated_at = DateTimeField(null=True)
+    change_id = BigIntegerField(null=True)  # Id of the last writing transaction
+
+class Book(SyncedModel):
     title = CharField()
     author = CharField()
     isbn = CharField(unique=True)
@@ -18,7 +25,7 @@ class Book(BaseModel):
     mrp = FloatField()  # Maximum Retail Price
     times_issued = IntegerField(default=0)  # Number of times issued
 
-class Member(BaseModel):
+class Member(SyncedModel):
     first_name = CharField()
     last_name = CharField()
     member_id = CharField(unique=True)  # Auto-generated
@@ -39,7 +46,7 @@ class Member(BaseModel):
     card_status = CharField(choices=[('Active', 'Active'), ('Inactive', 'Inactive'), ('Suspended', 'Suspended')])
     card_expiry = DateField(null=True)  # Auto-generated based on joining date
 
-class Transaction(BaseModel):
+class Transaction(SyncedModel):
     member = ForeignKeyField(Member, backref='transactions')
     book = ForeignKeyField(Book, backref='transactions')
     issue_date = DateField(default=date.today)  # Default to today
@@ -52,6 +59,53 @@ class Transaction(BaseModel):
     mode_of_payment = CharField(choices=[('cash', 'Cash'), ('online', 'Online')], null=True)
     invoice_id = CharField(null=True, unique=True)  # For fine tracking
 
-# Connect and create tables
-db.connect()
-db.create_tables([Book, Member, Transaction], safe=True)
+    # ARN work queue state, drained by arn_worker.py
+    arn_status = CharField(default='pending', choices=[('pending', 'Pending'), ('in_flight', 'In Flight'), ('done', 'Done'), ('failed', 'Failed')])
+    arn_attempts = IntegerField(default=0)
+    arn_next_attempt = DateTimeField(default=datetime.now)  # Backoff / lease expiry
+
+class TransactionArchive(Transaction):
+    # Settled loans moved out of "transaction" by archive.py, with the same columns and ids
+    member = ForeignKeyField(Member, backref='archived_transactions')
+    book = ForeignKeyField(Book, backref='archived_transactions')
+
+    class Meta:
+        table_name = 'transaction_archive'
+
+class CirculationCounter(BaseModel):
+    # Issues/returns per day, maintained by the issue/return path (see stats.py).
+    # Split over shards so concurrent issues don't all queue on one row.
+    day = DateField()
+    shard = IntegerField()
+    issued = IntegerField(default=0)
+    returned = IntegerField(default=0)
+
+    class Meta:
+        table_name = 'circulation_counter'
+        primary_key = CompositeKey('day', 'shard')
+
+class BookCover(BaseModel):
+    # Cover lookups by ISBN, filled in by covers.py; kept when a book is deleted
+    isbn = CharField(primary_key=True)
+    status = CharField(choices=[('found', 'Found'), ('missing', 'Missing'), ('failed', 'Failed')])
+    source_url = CharField(null=True)
+    thumbnail = CharField(null=True)  # File name under COVER_DIR
+    attempts = IntegerField(default=0)
+    checked_at = DateTimeField(default=datetime.now)
+    next_attempt = DateTimeField(null=True)  # When to look again if not found
+
+    class Meta:
+        table_name = 'book_cover'
+
+class SyncTombstone(BaseModel):
+    # Deleted book/member/transaction ids, recorded by trigger for the sync endpoints
+    table_name = CharField()
+    row_id = IntegerField()
+    change_id = BigIntegerField()
+    deleted_at = DateTimeField()
+
+    class Meta:
+        table_name = 'sync_tombstone'
+        primary_key = CompositeKey('table_name', 'row_id')
+
+# The schema (tables and indexes) is managed by migrate.py, not created on import
@@ -0,0 +1,248 @@
+"""PDF rendering for library cards and transaction receipts.
+
+WeasyPrint layout is CPU-bound and slow, so it runs in a small process pool
+instead of inside the request worker. Rendered PDFs are stored on disk under
+the SHA-256 of the HTML they were rendered from: a card or receipt is only
+rendered once, and any change to the member or transaction changes the HTML
+and therefore the cache key, so stale PDFs are never served. Each pool process
+keeps one FontConfiguration and an in-memory copy of the stylesheets, fonts
+and images it has fetched most recently, so the CDN CSS and web fonts the
+print templates pull in are downloaded and loaded once per process rather than
+once per PDF.
+
+Edits leave the PDFs rendered from the old HTML behind; prune them daily:
+
+Usage:
+    python pdf_render.py --prune              # delete PDFs not written for PDF_CACHE_DAYS
+    python pdf_render.py --prune --days 7
+"""
+import argparse
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from cache import LRUCache
+from metrics import PDF_CACHE, PDF_RENDER
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(BASE_DIR, "instance", "pdf_cache"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 2))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", 60))
+PDF_CACHE_DAYS = int(os.getenv("PDF_CACHE_DAYS", 30))
+PDF_FETCH_CACHE_SIZE = int(os.getenv("PDF_FETCH_CACHE_SIZE", 128))  # Stylesheets, fonts and images per pool process
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Per pool-process state, set up by _init_worker()
+_font_config = None
+_url_fetcher = None
+
+
+def _init_worker():
+    global _font_config, _url_fetcher
+    from weasyprint.text.fonts import FontConfiguration
+    from weasyprint.urls import URLFetcher, URLFetcherResponse
+
+    class CachingURLFetcher(URLFetcher):
+        """Fetch each stylesheet, font or image once and replay it from memory afterwards."""
+        # Bounded, and refetched daily so an updated CDN stylesheet is picked up
+        resources = LRUCache(maxsize=PDF_FETCH_CACHE_SIZE, ttl=24 * 3600)
+
+        def fetch(self, url, headers=None):
+            cached = self.resources.get(url)
+            if cached is None:
+                response = super().fetch(url, headers)
+                try:
+                    cached = (response.url, response.read(), response.headers, response.status)
+                finally:
+                    response.close()
+                self.resources.set(url, cached)
+            response_url, body, response_headers, status = cached
+            return URLFetcherResponse(response_url, body, response_headers, status)
+
+    _font_config = FontConfiguration()
+    _url_fetcher = CachingURLFetcher()
+
+
+def _render(html, base_url=None):
+    from weasyprint import HTML
+    return HTML(string=html, base_url=base_url, url_fetcher=_url_fetcher).write_pdf(font_config=_font_config)
+
+
+def _timed(render, *args):
+    """Run render(*args) in a pool process; returns (pdf, seconds spent rendering)."""
+    started = time.perf_counter()
+    pdf = render(*args)
+    return pdf, time.perf_counter() - started
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: pool processes must not inherit the parent's DB connections or threads
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+    return _executor
+
+
+def _discard_executor(broken):
+    """Drop a pool that lost a process (OOM, crash, failed initializer); the next call starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(timeout, render, *args):
+    """Run render(*args) in the pool, retrying once in a new pool if the current one is broken."""
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            return executor.submit(_timed, render, *args).result(timeout=timeout)
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            if attempt:
+                raise
+
+
+def cache_path(html, base_url=None):
+    key = hashlib.sha256(f"{base_url or ''}\0{html}".encode("utf-8")).hexdigest()
+    return os.path.join(PDF_CACHE_DIR, key[:2], f"{key}.pdf")
+
+
+def _read_cache(path):
+    try:
+        with open(path, "rb") as f:
+            pdf = f.read()
+    except FileNotFoundError:
+        PDF_CACHE.inc(result="miss")
+        return None
+    PDF_CACHE.inc(result="hit")
+    return pdf
+
+
+def _write_cache(path, pdf):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+
+def render_pdf(html, base_url=None):
+    """Return the PDF for html, from the disk cache or rendered in the pool."""
+    path = cache_path(html, base_url)
+    pdf = _read_cache(path)
+    if pdf is None:
+        pdf, seconds = _run(PDF_RENDER_TIMEOUT, _render, html, base_url)
+        PDF_RENDER.observe(seconds, mode="single")
+        _write_cache(path, pdf)
+    return pdf
+
+
+def render_each(documents):
+    """Render (name, html) pairs across the pool, yielding (name, pdf) as each one completes.
+
+    At most a few documents per worker are in flight at a time, so arbitrarily
+    long (lazy) inputs are rendered without holding them all in memory.
+    """
+    executor = get_executor()
+    in_flight = {}
+
+    def collect(return_when):
+        done, _ = wait(in_flight, timeout=PDF_RENDER_TIMEOUT, return_when=return_when)
+        if not done:
+            raise TimeoutError(f"No PDF finished rendering in {PDF_RENDER_TIMEOUT:.0f}s")
+        for future in done:
+            name, path = in_flight.pop(future)
+            try:
+                pdf, seconds = future.result()
+            except BrokenProcessPool:
+                _discard_executor(executor)  # This batch fails, but later requests get a working pool
+                raise
+            PDF_RENDER.observe(seconds, mode="batch")
+            _write_cache(path, pdf)
+            yield name, pdf
+
+    for name, html in documents:
+        path = cache_path(html)
+        pdf = _read_cache(path)
+        if pdf is not None:
+            yield name, pdf
+            continue
+        try:
+            future = executor.submit(_timed, _render, html)
+        except BrokenProcessPool:
+            # Broken by an earlier request: nothing of this batch is lost yet, so start a new pool
+            _discard_executor(executor)
+            if in_flight:
+                raise
+            executor = get_executor()
+            future = executor.submit(_timed, _render, html)
+        in_flight[future] = (name, path)
+        if len(in_flight) >= PDF_WORKERS * 4:
+            yield from collect(FIRST_COMPLETED)
+
+    while in_flight:
+        yield from collect(FIRST_COMPLETED)
+
+
+def render_merged(documents, progress=None):
+    """Render (name, html) pairs with render_each and return one PDF of all their pages, in input order.
+
+    Each document is rendered in parallel and cached on its own, so reprinting
+    a batch, or a merged batch overlapping a zipped one, renders nothing twice.
+    progress, if given, is called with the number of documents done so far.
+    """
+    from pypdf import PdfWriter
+    pdfs = {}
+    numbered = ((index, html) for index, (_, html) in enumerate(documents))
+    for done, (index, pdf) in enumerate(render_each(numbered), 1):
+        pdfs[index] = pdf
+        if progress:
+            progress(done)
+    writer = PdfWriter()
+    for index in sorted(pdfs):
+        writer.append(io.BytesIO(pdfs.pop(index)))
+    merged = io.BytesIO()
+    writer.write(merged)
+    return merged.getvalue()
+
+
+def prune_cache(days: int = PDF_CACHE_DAYS) -> int:
+    """Delete cached PDFs (and stray temporary files) not written for days. Returns the count removed."""
+    cutoff = time.time() - days * 24 * 3600
+    removed = 0
+    for root, _, files in os.walk(PDF_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Renamed into place or pruned concurrently
+    return removed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prune", action="store_true", help="Delete cached PDFs not written for --days")
+    parser.add_argument("--days", type=int, default=PDF_CACHE_DAYS)
+    args = parser.parse_args()
+
+    if args.prune:
+        print(f"Pruned {prune_cache(args.days)} cached PDF(s)")
+    else:
+        parser.print_help()
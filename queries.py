@@ -0,0 +1,46 @@
+"""Column-narrowed queries shared by the views.
+
+Each view selects only the columns its template or JSON payload reads, with
+related rows joined (or annotated) in the same statement, so rendering a page
+never falls back to lazy per-row loads of ``transaction.member``,
+``transaction.book`` or ``member.transactions``.
+"""
+from peewee import fn
+from models import Book, BookCover, Member, Transaction, TransactionArchive
+
+# Member/book columns read alongside a transaction (list page, JSON, receipts)
+TRANSACTION_PARTY_COLUMNS = (Member.id, Member.member_id, Member.first_name, Member.last_name,
+                             Book.id, Book.title)
+
+
+def transactions_with_parties(model=Transaction):
+    """Transactions (or archived ones) with the member and book columns the views need, joined in one query."""
+    return (model
+            .select(model, *TRANSACTION_PARTY_COLUMNS)
+            .join(Member)
+            .switch(model)
+            .join(Book))
+
+
+def receipt(transaction_id: int) -> Transaction:
+    """The transaction for a receipt, archived or not, raising Transaction.DoesNotExist if missing."""
+    for model in (Transaction, TransactionArchive):
+        transaction = transactions_with_parties(model).where(model.id == transaction_id).first()
+        if transaction:
+            return transaction
+    raise Transaction.DoesNotExist(f"Transaction {transaction_id} not found")
+
+
+def members_with_activity():
+    """Members annotated with ``has_transactions`` instead of counting member.transactions per row."""
+    has_transactions = (fn.EXISTS(Transaction.select(Transaction.id).where(Transaction.member == Member.id)) |
+                        fn.EXISTS(TransactionArchive.select(TransactionArchive.id)
+                                  .where(TransactionArchive.member == Member.id)))
+    return Member.select(Member, has_transactions.alias('has_transactions'))
+
+
+
+def books_with_covers():
+    """Books annotated with ``cover_thumbnail``, the file name of their cover thumbnail (None if none yet)."""
+    thumbnail = BookCover.select(BookCover.thumbnail).where(BookCover.isbn == Book.isbn)
+    return Book.select(Book, thumbnail.alias('cover_thumbnail'))
@@ -0,0 +1,98 @@
+"""Response caching for the read-heavy list pages, settings and CSV downloads.
+
+``@cached_response(*namespaces)`` stores a view's rendered 200 response in the
+cache backend (cache.py), keyed on the path, the query arguments and the
+current version of each namespace the page is built from, for at most
+``RESPONSE_CACHE_TTL`` seconds (which bounds how stale date-dependent content
+such as overdue loans can get). Every response carries an ETag of its body, and
+a request whose ``If-None-Match`` matches gets an empty 304.
+
+CSV downloads are streamed and too large to keep in memory, so
+``@versioned_response(*namespaces)`` only gives them an ETag derived from the
+path, arguments and namespace versions, and answers a matching
+``If-None-Match`` with a 304 before the view (and the database) is touched.
+
+``@invalidates(*namespaces)`` goes on every view that writes: after any
+non-GET request it bumps the namespaces' versions. Code that writes outside a
+request (arn_worker.py, fines.py, import_books.py) calls
+``cache.invalidate()`` itself.
+"""
+import hashlib
+import os
+from functools import wraps
+from flask import Response, make_response, request
+from cache import get_backend, invalidate
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 60))
+
+
+def _request_key(namespaces):
+    backend = get_backend()
+    versions = [f"{namespace}:{backend.version(namespace)}" for namespace in namespaces]
+    args = sorted(request.args.items(multi=True))
+    return hashlib.sha256(repr((request.path, args, versions)).encode()).hexdigest()
+
+
+def _no_cache(response):
+    # Browsers may keep the response but must revalidate it with If-None-Match
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_response(*namespaces):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Versions are read before rendering, so a write that lands mid-render
+            # leaves the result under a key nobody will look up again
+            key = "response:" + _request_key(namespaces)
+            backend = get_backend()
+            entry = backend.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body.decode('latin-1'),
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha256(body).hexdigest()[:32],
+                }
+                backend.set(key, entry, RESPONSE_CACHE_TTL)
+
+            response = Response(entry['body'].encode('latin-1'), mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            return _no_cache(response.make_conditional(request))
+        return wrapper
+    return decorator
+
+
+def versioned_response(*namespaces):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = _request_key(namespaces)[:32]
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            return _no_cache(response)
+        return wrapper
+    return decorator
+
+
+def invalidates(*namespaces):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            finally:
+                # Also on errors: a failed bulk operation may have committed some chunks
+                if request.method != 'GET':
+                    invalidate(*namespaces)
+        return wrapper
+    return decorator
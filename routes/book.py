@@ -1,13 +1,22 @@
-import csv
-from io import StringIO
-from peewee import IntegrityError
-from models import Book, Transaction
+from peewee import IntegrityError, fn
+from config.config import db
+from models import Book, Transaction, TransactionArchive
 from books_api import fetch_books, save_books_to_db
-from flask import Blueprint, redirect, render_template, request, jsonify, Response, url_for
+from exports import csv_response
+from response_cache import cached_response, invalidates, versioned_response
+from typeahead import get_limit, search_books
+from listing import book_page, filter_options, first_page_url, get_page_size, next_page_url
+from search import search_catalogue
+from sync import CursorExpired, changes
+from covers import COVER_DIR, COVER_MAX_AGE, PLACEHOLDER_GZIP, PLACEHOLDER_NAME, PLACEHOLDER_SVG, cover_url
+from flask import Blueprint, Response, redirect, render_template, request, jsonify, send_from_directory, url_for
 from typing import List, Dict, Any, Union, Optional
 
 bp = Blueprint('book', __name__, url_prefix='/book')
 
+# Max ids per DELETE ... WHERE id IN (...) statement in bulk deletes
+BULK_DELETE_CHUNK = 1000
+
 # Serialize a book instance to dictionary.
 def serialize_book(book: Book) -> Dict[str, Any]:
 
@@ -30,16 +39,99 @@ def get_book_by_id(book_id: int) -> Optional[Book]:
     return Book.get_or_none(Book.id == book_id)
 
 
-# List all books.
+# List one page of books, filtered and sorted server-side.
 @bp.route('/list')
+@cached_response("book")
 def books():
 
-    all_books = Book.select()
-    return render_template("books.html", books=all_books)
+    page = book_page(request.args)
+    return render_template(
+        "books.html",
+        books=page.items,
+        page=page,
+        next_url=next_page_url(page),
+        first_url=first_page_url(),
+        languages=filter_options(Book.language, request.args.get('language')),
+        publishers=filter_options(Book.publisher, request.args.get('publisher')),
+        cover_url=cover_url
+    )
+
+
+# Same page of books as JSON.
+@bp.route('/list/data')
+@cached_response("book")
+def books_data():
+
+    page = book_page(request.args)
+    return jsonify({
+        "books": [{**serialize_book(book), 'cover_url': cover_url(book.cover_thumbnail)} for book in page.items],
+        "next_cursor": page.next_cursor,
+        "page_size": page.page_size
+    })
+
+
+# Incremental sync: books changed and ids deleted since ?cursor=, see sync.py
+@bp.route('/changes')
+def book_changes():
+    try:
+        return jsonify(changes(Book, Book.select(), serialize_book, request.args))
+    except CursorExpired as e:
+        return jsonify({"success": False, "message": str(e)}), 410
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+
+# Cover thumbnails resolved by covers.py. Names are content hashes, so browsers may keep them forever.
+@bp.route('/covers/<name>')
+def cover(name):
+
+    if name == PLACEHOLDER_NAME:
+        gzipped = 'gzip' in request.accept_encodings
+        response = Response(PLACEHOLDER_GZIP if gzipped else PLACEHOLDER_SVG, mimetype='image/svg+xml')
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = COVER_MAX_AGE
+    else:
+        response = send_from_directory(COVER_DIR, name, max_age=COVER_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+
+# Relevance-ranked full-text search with language/publisher facet counts,
+# e.g. /book/search?q=tolkien&language=English&page=2
+@bp.route('/search')
+def search():
+
+    try:
+        page = int(request.args.get('page', 1))
+    except ValueError:
+        page = 1
+    results = search_catalogue(request.args.get('q', ''), request.args.get('language'),
+                               request.args.get('publisher'), page, get_page_size(request.args))
+    return jsonify({
+        "books": results.items,
+        "total": results.total,
+        "facets": results.facets,
+        "page": results.page,
+        "page_size": results.page_size,
+        "capped": results.capped
+    })
+
+
+# Top title/author/ISBN matches for the issue form, e.g. /book/typeahead?q=gatsby&in_stock=1
+@bp.route('/typeahead')
+def typeahead():
+
+    results = search_books(request.args.get('q', ''), get_limit(request.args),
+                           in_stock=bool(request.args.get('in_stock')))
+    return jsonify({"results": results})
 
 
 # Handle book API integration.
 @bp.route('/api', methods=["GET", "POST"])
+@invalidates("book")
 def index():
 
     if request.method == "POST":
@@ -61,39 +153,20 @@ def index():
     return render_template("books_api.html", books=[])
 
 
-# Generate and download books CSV.
+# Stream books as a CSV download.
 @bp.route('/download-csv', methods=['GET'])
+@versioned_response("book")
 def download_books_csv():
 
-    books = Book.select()
+    query = Book.select(Book.id, Book.title, Book.author, Book.language, Book.publisher, Book.stock).order_by(Book.id)
     headers = ["Book ID", "Title", "Author", "Language", "Publisher", "Stock"]
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(headers)
-
-    for book in books:
-        writer.writerow([
-            book.id,
-            book.title,
-            book.author,
-            book.language,
-            book.publisher,
-            book.stock
-        ])
-
-    output.seek(0)
-    response = Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=library_books.csv"}
-    )
-    
-    return response
+
+    return csv_response(query, headers, "library_books.csv")
 
 
 # Create a new book.
 @bp.route('/create', methods=['GET', 'POST'])
+@invalidates("book")
 def create_book():
 
     if request.method == 'POST':
@@ -133,6 +206,7 @@ def create_book():
 
 # Edit an existing book.
 @bp.route('/edit/<int:book_id>', methods=['GET', 'POST'])
+@invalidates("book")
 def edit_books(book_id: int):
 
     book = get_book_by_id(book_id)
@@ -160,6 +234,7 @@ def edit_books(book_id: int):
 
 # Delete a single book.
 @bp.route('/delete/<int:book_id>', methods=['DELETE'])
+@invalidates("book")
 def delete_book(book_id: int):
 
     book = get_book_by_id(book_id)
@@ -169,7 +244,7 @@ def delete_book(book_id: int):
             "message": "Book not found"
         }), 404
 
-    if Transaction.select().where(Transaction.book == book).exists():
+    if any(model.select().where(model.book == book).exists() for model in (Transaction, TransactionArchive)):
         return jsonify({
             "success": False,
             "message": "This book can't be deleted as it is linked to a transaction."
@@ -190,6 +265,7 @@ def delete_book(book_id: int):
 
 # Delete multiple books at once.
 @bp.route('/delete-bulk', methods=['POST'])
+@invalidates("book")
 def bulk_delete_books():
     data = request.get_json()
     book_ids = data.get("book_ids", [])
@@ -204,15 +280,24 @@ def bulk_delete_books():
     failed_books = []
 
     try:
-        for book_id in book_ids:
-            book = Book.get_or_none(Book.id == book_id)  # Ensure book retrieval
-
-            if book:
-                if Transaction.select().where(Transaction.book == book).exists():
-                    failed_books.append({"title": book.title, "stock": book.stock})  # JSON format
-                else:
-                    deleted_books.append({"title": book.title, "stock": book.stock})
-                    book.delete_instance()
+        # Per chunk: one DELETE for unlinked books, one SELECT for the ones left behind
+        with db.atomic():
+            for start in range(0, len(book_ids), BULK_DELETE_CHUNK):
+                chunk = book_ids[start:start + BULK_DELETE_CHUNK]
+                linked = (fn.EXISTS(Transaction.select(Transaction.id).where(Transaction.book == Book.id)) |
+                          fn.EXISTS(TransactionArchive.select(TransactionArchive.id)
+                                    .where(TransactionArchive.book == Book.id)))
+
+                deleted = (Book
+                           .delete()
+                           .where(Book.id.in_(chunk) & ~linked)
+                           .returning(Book.title, Book.stock)
+                           .tuples()
+                           .execute())
+                deleted_books.extend({"title": title, "stock": stock} for title, stock in deleted)
+
+                remaining = Book.select(Book.title, Book.stock).where(Book.id.in_(chunk)).tuples()
+                failed_books.extend({"title": title, "stock": stock} for title, stock in remaining)
 
         return jsonify({
             "success": True,
@@ -0,0 +1,65 @@
+from flask import Blueprint, Response, render_template, jsonify, request
+from config.config import pool_stats
+from config.settings import get_settings, update_settings
+from stats import get_stats
+from response_cache import cached_response, invalidates
+import metrics
+
+bp = Blueprint('main', __name__)
+
+
+@bp.route('/')
+def home():
+    return render_template("home.html", stats=get_stats())
+
+
+@bp.route('/update-rent', methods=['POST'])
+@invalidates("settings")
+def update_rent():
+    try:
+        # Get the new rent amount (and optionally the overdue fine rate) from the form data
+        new_rent = int(request.form['rent_amount'])
+        changes = {"rent_amount": new_rent}
+        if request.form.get('fine_per_day'):
+            changes["fine_per_day"] = int(request.form['fine_per_day'])
+
+        # Atomically rewrite the settings file; other workers pick it up on their next check
+        new_settings = update_settings(**changes)
+
+        return jsonify({"success": True, "message": f"Rent updated to ₹{new_rent}, fine ₹{new_settings['fine_per_day']} per late day",
+                        "new_rent": new_rent}), 200
+
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
+
+
+
+# Dashboard totals (materialized, see stats.py), circulation per day and most-issued books
+@bp.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(get_stats())
+
+
+@bp.route('/db/pool', methods=['GET'])
+def db_pool():
+    return jsonify(pool_stats())
+
+
+# Prometheus scrape endpoint: request/query latency, outbound API and PDF timings, pool usage
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route('/settings', methods=['GET'])
+@cached_response("settings")
+def settings():
+    try:
+        # Get the current rent amount and fine rate (cached, defaults apply if not set)
+        current = get_settings()
+
+        return render_template('settings.html', current_rent=current["rent_amount"],
+                               current_fine=current["fine_per_day"])
+
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
@@ -1,19 +1,79 @@
-import csv
-from weasyprint import HTML
-from models import Member
-from io import StringIO
-from peewee import IntegrityError
+from config.config import db
+from models import CARD_VALIDITY_DAYS, Member, Transaction, TransactionArchive
+from exports import csv_response
+from response_cache import cached_response, invalidates, versioned_response
+from pdf_render import render_pdf
+from batch_print import batch_response, card_documents, parse_date, parse_ids, select_members
+from typeahead import get_limit, search_members
+from listing import member_page, filter_options, first_page_url, next_page_url
+from queries import members_with_activity
+from sync import CursorExpired, changes
+from peewee import IntegrityError, fn
 from datetime import datetime, timedelta
 from flask import Blueprint, render_template, request, jsonify, Response, redirect
 
 bp = Blueprint('member', __name__, url_prefix='/member')
 
+# Max ids per DELETE ... WHERE id IN (...) statement in bulk deletes
+BULK_DELETE_CHUNK = 1000
+
+def serialize_member(member):
+    return {
+        'id': member.id,
+        'member_id': member.member_id,
+        'first_name': member.first_name,
+        'last_name': member.last_name,
+        'email': member.email,
+        'phone': member.phone,
+        'city': member.city,
+        'state': member.state,
+        'outstanding_debt': float(member.outstanding_debt),
+        'card_status': member.card_status,
+        'has_transactions': bool(member.has_transactions)
+    }
+
 @bp.route('/list')
+@cached_response("member", "transaction")
 def members():
-    all_members = Member.select()
-    return render_template("members.html", members=all_members)
+    page = member_page(request.args)
+    return render_template(
+        "members.html",
+        members=page.items,
+        page=page,
+        next_url=next_page_url(page),
+        first_url=first_page_url(),
+        cities=filter_options(Member.city, request.args.get('city')),
+        states=filter_options(Member.state, request.args.get('state'))
+    )
+
+@bp.route('/list/data')
+@cached_response("member", "transaction")
+def members_data():
+    page = member_page(request.args)
+    return jsonify({
+        "members": [serialize_member(member) for member in page.items],
+        "next_cursor": page.next_cursor,
+        "page_size": page.page_size
+    })
+
+# Incremental sync: members changed and ids deleted since ?cursor=, see sync.py
+@bp.route('/changes')
+def member_changes():
+    try:
+        return jsonify(changes(Member, members_with_activity(), serialize_member, request.args))
+    except CursorExpired as e:
+        return jsonify({"success": False, "message": str(e)}), 410
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+# Top name/member_id/phone/email matches for the issue form, e.g. /member/typeahead?q=ram
+@bp.route('/typeahead')
+def typeahead():
+    results = search_members(request.args.get('q', ''), get_limit(request.args))
+    return jsonify({"results": results})
 
 @bp.route('/create', methods=['GET', 'POST'])
+@invalidates("member")
 def create_member():
     if request.method == 'POST':
         try:
@@ -38,7 +98,7 @@ def create_member():
                          phone[-2:])
             
             card_status = "Active"
-            card_expiry = today + timedelta(days=730)
+            card_expiry = today + timedelta(days=CARD_VALIDITY_DAYS)
 
             new_member = Member.create(
                 first_name=first_name,
@@ -69,27 +129,22 @@ def create_member():
     return render_template("create-member.html")
 
 @bp.route('/download-csv', methods=['GET'])
+@versioned_response("member")
 def download_members_csv():
-    members = Member.select()
-
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Member ID", "First Name", "Last Name", "Gender", "DOB", "Email", "Phone", "Address"])
-
-    for member in members:
-        writer.writerow([
-            member.member_id, member.first_name, member.last_name, 
-            member.gender, member.dob, member.email, 
-            member.phone, f"{member.locality}, {member.city}, {member.state}, {member.pincode}"
-        ])
-
-    output.seek(0)
-    response = Response(output.getvalue(), mimetype="text/csv")
-    response.headers["Content-Disposition"] = "attachment; filename=library_members.csv"
-    
-    return response
+    query = (Member
+             .select(Member.member_id, Member.first_name, Member.last_name, Member.gender, Member.dob,
+                     Member.email, Member.phone, Member.locality, Member.city, Member.state, Member.pincode)
+             .order_by(Member.id))
+    headers = ["Member ID", "First Name", "Last Name", "Gender", "DOB", "Email", "Phone", "Address"]
+
+    def to_row(row):
+        locality, city, state, pincode = row[7:]
+        return row[:7] + (f"{locality}, {city}, {state}, {pincode}",)
+
+    return csv_response(query, headers, "library_members.csv", to_row)
 
 @bp.route('/edit/<int:member_id>', methods=['GET', 'POST'])
+@invalidates("member")
 def edit_member(member_id):
     member = Member.get_or_none(Member.id == member_id)
     if not member:
@@ -120,6 +175,7 @@ def edit_member(member_id):
     return render_template("edit-member.html", member=member)
 
 @bp.route("/delete/<int:member_id>", methods=["DELETE"])
+@invalidates("member")
 def delete_member(member_id):
     try:
         member = Member.get_or_none(Member.id == member_id)
@@ -137,6 +193,7 @@ def delete_member(member_id):
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/delete-bulk', methods=['POST'])
+@invalidates("member")
 def bulk_delete_members():
     data = request.get_json()
     member_ids = data.get("member_ids", [])
@@ -144,29 +201,41 @@ def bulk_delete_members():
     if not member_ids:
         return jsonify({"message": "No members selected!"}), 400
 
-    deletable_members = []
+    deleted_count = 0
     blocked_members = []
 
-    for member_id in member_ids:
-        member = Member.get_or_none(Member.id == member_id)
-        if member:
-            if member.outstanding_debt > 0:
-                blocked_members.append(f"{member.first_name} {member.last_name} (₹{member.outstanding_debt})")
-            else:
-                deletable_members.append(member)
-
-    if deletable_members:
-        for member in deletable_members:
-            member.delete_instance()
+    try:
+        # Per chunk: one DELETE for debt-free members without loans, one SELECT for the blocked ones
+        with db.atomic():
+            for start in range(0, len(member_ids), BULK_DELETE_CHUNK):
+                chunk = member_ids[start:start + BULK_DELETE_CHUNK]
+                linked = (fn.EXISTS(Transaction.select(Transaction.id).where(Transaction.member == Member.id)) |
+                          fn.EXISTS(TransactionArchive.select(TransactionArchive.id)
+                                    .where(TransactionArchive.member == Member.id)))
+
+                deleted_count += (Member
+                                  .delete()
+                                  .where(Member.id.in_(chunk) & (Member.outstanding_debt <= 0) & ~linked)
+                                  .execute())
+
+                blocked = (Member
+                           .select(Member.first_name, Member.last_name, Member.outstanding_debt)
+                           .where(Member.id.in_(chunk))
+                           .tuples())
+                blocked_members.extend(f"{first_name} {last_name} (₹{debt})" if debt > 0
+                                       else f"{first_name} {last_name} (has transactions)"
+                                       for first_name, last_name, debt in blocked)
+    except Exception as e:
+        return jsonify({"message": f"Error during bulk delete: {str(e)}"}), 500
 
     if blocked_members:
         return jsonify({
             "success": False,
             "blocked_members": blocked_members,
-            "deleted_count": len(deletable_members)
+            "deleted_count": deleted_count
         }), 400
 
-    return jsonify({"success": True, "message": f"Deleted {len(deletable_members)} members."}), 200
+    return jsonify({"success": True, "message": f"Deleted {deleted_count} members."}), 200
 
 @bp.route("/view-card/<int:member_id>")
 def view_card(member_id):
@@ -181,10 +250,23 @@ def download_pdf(member_id):
     if not member:
         return "Member Not Found", 404
 
-    html = HTML(string=render_template("print/library-card.html", member=member))
-    pdf_content = html.write_pdf()
+    pdf_content = render_pdf(render_template("print/library-card.html", member=member))
 
     response = Response(pdf_content, content_type="application/pdf")
     response.headers["Content-Disposition"] = f"inline; filename=Library_Card_{member.member_id}.pdf"
 
-    return response
\ No newline at end of file
+    return response
+
+# Print many cards in one job, e.g. /member/print-cards?card_status=Active&joined_from=2025-06-01
+@bp.route("/print-cards")
+def print_cards():
+    try:
+        query = select_members(
+            ids=parse_ids(request.args.get("ids")),
+            card_status=request.args.get("card_status"),
+            joined_from=parse_date(request.args.get("joined_from")),
+            joined_to=parse_date(request.args.get("joined_to"))
+        )
+    except ValueError:
+        return jsonify({"success": False, "message": "ids must be comma-separated numbers and dates YYYY-MM-DD"}), 400
+    return batch_response(card_documents(query), query.count(), "Library_Cards")
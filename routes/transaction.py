@@ -1,79 +1,110 @@
-import csv
-from weasyprint import HTML
-from models import Transaction, Member, Book
-from datetime import datetime, date, timedelta
-from flask import Blueprint, render_template, request, jsonify, Response, make_response
-from io import StringIO
-from books_api import generate_arn
-import json
+from models import Transaction, TransactionArchive, Member, Book
+from config.config import db
+from datetime import datetime, date
+from flask import Blueprint, render_template, request, jsonify, make_response
+from peewee import SQL
+from circulation import CirculationError, issue_book, return_book
+from exports import csv_response
+from response_cache import cached_response, invalidates, versioned_response
+from pdf_render import render_pdf
+from batch_print import batch_response, parse_date, parse_ids, receipt_documents, select_transactions
+from config.settings import get_rent
+from fines import get_fine_rate
+from queries import receipt, transactions_with_parties
+from sync import CursorExpired, changes
+from listing import transaction_page, first_page_url, next_page_url
 
 bp = Blueprint('transaction', __name__, url_prefix='/transaction')
-CONFIG_FILE = "rent.json"
+
+def serialize_transaction(transaction):
+    return {
+        'id': transaction.id,
+        'member_id': transaction.member.member_id,
+        'member_name': f"{transaction.member.first_name} {transaction.member.last_name}",
+        'book_id': transaction.book.id,
+        'book_title': transaction.book.title,
+        'issue_date': transaction.issue_date.isoformat(),
+        'due_date': transaction.due_date.isoformat(),
+        'return_date': transaction.return_date.isoformat() if transaction.return_date else None,
+        'rent_fee': float(transaction.rent_fee),
+        'fine': float(transaction.fine),
+        'status': transaction.status,
+        'invoice_id': transaction.invoice_id
+    }
+
 @bp.route('/list')
+@cached_response("transaction", "member", "book", "settings")
 def transactions():
-    all_transactions = Transaction.select().join(Member).switch(Transaction).join(Book)
-    
-    for transaction in all_transactions:
-        if transaction.invoice_id is None:
-            arn = generate_arn(transaction)
-            if arn:
-                transaction.invoice_id = arn
-                transaction.save()
-    
-    return render_template("transactions.html", transactions=all_transactions)
+    # Invoice ids are filled in asynchronously by arn_worker.py; ?status=archived lists settled loans (archive.py)
+    page = transaction_page(request.args)
+    return render_template(
+        "transactions.html",
+        transactions=page.items,
+        page=page,
+        next_url=next_page_url(page),
+        first_url=first_page_url(),
+        fine_per_day=get_fine_rate()
+    )
+
+@bp.route('/list/data')
+@cached_response("transaction", "member", "book")
+def transactions_data():
+    page = transaction_page(request.args)
+    return jsonify({
+        "transactions": [serialize_transaction(transaction) for transaction in page.items],
+        "next_cursor": page.next_cursor,
+        "page_size": page.page_size
+    })
+
+# Incremental sync: transactions changed and ids deleted since ?cursor=, see sync.py.
+# Covers the working table only; archiving a loan is not a delete.
+@bp.route('/changes')
+def transaction_changes():
+    try:
+        return jsonify(changes(Transaction, transactions_with_parties(), serialize_transaction, request.args))
+    except CursorExpired as e:
+        return jsonify({"success": False, "message": str(e)}), 410
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
 @bp.route('/download-csv', methods=['GET'])
+@versioned_response("transaction", "member", "book")
 def download_transactions_csv():
-    transactions = Transaction.select().join(Member).switch(Transaction).join(Book)
-
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["Transaction ID", "Member Name", "Book Title", "Issue Date", "Due Date", "Status"])
+    # Archived loans included
+    def rows(model):
+        return (model
+                .select(model.id, Member.first_name, Member.last_name, Book.title,
+                        model.issue_date, model.due_date, model.status)
+                .join(Member)
+                .switch(model)
+                .join(Book))
 
-    for transaction in transactions:
-        writer.writerow([
-            transaction.id, 
-            f"{transaction.member.first_name} {transaction.member.last_name}", 
-            transaction.book.title,
-            transaction.issue_date,
-            transaction.due_date,
-            transaction.status
-        ])
+    query = (rows(TransactionArchive) + rows(Transaction)).order_by(SQL('1'))
+    headers = ["Transaction ID", "Member Name", "Book Title", "Issue Date", "Due Date", "Status"]
 
-    output.seek(0)
-    response = Response(output.getvalue(), mimetype="text/csv")
-    response.headers["Content-Disposition"] = "attachment; filename=library_transactions.csv"
+    def to_row(row):
+        transaction_id, first_name, last_name = row[:3]
+        return (transaction_id, f"{first_name} {last_name}") + row[3:]
 
-    return response
+    return csv_response(query, headers, "library_transactions.csv", to_row)
 
 @bp.route('/create', methods=['GET', 'POST'])
+@invalidates("transaction", "member", "book")
 def create_transaction():
     if request.method == 'GET':
-        members_data = [
-            {
-                'id': member.id,
-                'first_name': member.first_name,
-                'last_name': member.last_name,
-                'member_id': member.member_id,
-                'outstanding_debt': float(member.outstanding_debt)
-            }
-            for member in Member.select()
-        ]
-
-        books_data = [
-            {
-                'id': book.id,
-                'title': book.title,
-                'author': book.author,
-                'stock': book.stock
-            }
-            for book in Book.select().where(Book.stock > 0)
-        ]
-
+        # Members and books are looked up with /member/typeahead and /book/typeahead;
+        # only a member preselected via ?member_id= is rendered into the page
+        selected_member = None
+        if request.args.get('member_id'):
+            selected_member = (Member
+                               .select(Member.id, Member.member_id, Member.first_name, Member.last_name,
+                                       Member.outstanding_debt)
+                               .where(Member.member_id == request.args['member_id'])
+                               .dicts()
+                               .first())
         return render_template(
             "create-transaction.html",
-            members=members_data,
-            books=books_data,
+            selected_member=selected_member,
             today=date.today().strftime('%Y-%m-%d')
         )
 
@@ -83,47 +114,21 @@ def create_transaction():
             book_id = request.form['book']
             issue_date = datetime.strptime(request.form['issue_date'], '%Y-%m-%d').date()
             due_date = datetime.strptime(request.form['due_date'], '%Y-%m-%d').date()
-            
-            member = Member.get_by_id(member_id)
-            book = Book.get_by_id(book_id)
-
-            # Check outstanding debt
-            current_outstanding = member.outstanding_debt + get_rent()  # Adding new rent
-            if current_outstanding > 500:
-                return jsonify({
-                    "success": False,
-                    "message": "Cannot issue book. Outstanding debt would exceed ₹500"
-                }), 400
-
-            # Validate due date is at least 14 days after issue date
-            min_due_date = issue_date + timedelta(days=14)
-            if due_date < min_due_date:
-                return jsonify({
-                    "success": False,
-                    "message": "Due date must be at least 14 days after issue date"
-                }), 400
-
-            # Create transaction
-            transaction = Transaction.create(
-                member=member,
-                book=book,
-                issue_date=issue_date,
-                due_date=due_date,
-                status='issued',
-                rent_fee=get_rent()
-            )
-
-            # Update book stock and member debt
-            book.stock -= 1
-            book.save()
-            member.outstanding_debt = current_outstanding
-            member.save()
+
+            # Stock and debt are checked and updated atomically in the database
+            transaction, member, book = issue_book(member_id, book_id, issue_date, due_date, get_rent())
 
             return jsonify({
                 "success": True,
-                "message": f"Book '{book.title}' successfully issued to {member.first_name} {member.last_name}"
+                "message": f"Book '{book.title}' successfully issued to {member.first_name} {member.last_name}",
+                "transaction_id": transaction.id
             }), 201
 
+        except CirculationError as e:
+            return jsonify({
+                "success": False,
+                "message": str(e)
+            }), 400
         except Exception as e:
             return jsonify({
                 "success": False,
@@ -133,9 +138,9 @@ def create_transaction():
 @bp.route("/download-pdf/<int:id>")
 def download_transaction_pdf(id):
     try:
-        transaction = Transaction.get_by_id(id)
+        transaction = receipt(id)
         html_content = render_template("print/transaction-receipt.html", transaction=transaction)
-        pdf = HTML(string=html_content).write_pdf()
+        pdf = render_pdf(html_content)
         
         response = make_response(pdf)
         response.headers["Content-Type"] = "application/pdf"
@@ -145,10 +150,27 @@ def download_transaction_pdf(id):
     except Transaction.DoesNotExist:
         return "Transaction not found", 404
 
+# Print many receipts in one job, e.g. /transaction/print-receipts?date=2025-06-14
+@bp.route("/print-receipts")
+def print_receipts():
+    try:
+        day = parse_date(request.args.get("date"))
+        query = select_transactions(
+            ids=parse_ids(request.args.get("ids")),
+            issued_from=day or parse_date(request.args.get("from")),
+            issued_to=day or parse_date(request.args.get("to")),
+            status=request.args.get("status")
+        )
+    except ValueError:
+        return jsonify({"success": False, "message": "ids must be comma-separated numbers and dates YYYY-MM-DD"}), 400
+    return batch_response(receipt_documents(query), query.count(), "receipts")
+
 @bp.route('/delete/<int:transaction_id>', methods=['DELETE'])
+@invalidates("transaction", "member", "book")
 def delete_transaction(transaction_id):
     try:
-        transaction = Transaction.get_or_none(Transaction.id == transaction_id)
+        transaction = (Transaction.get_or_none(Transaction.id == transaction_id) or
+                       TransactionArchive.get_or_none(TransactionArchive.id == transaction_id))
         if transaction:
             transaction.delete_instance()
             return jsonify({'success': True, 'message': 'Transaction deleted successfully'}), 200
@@ -158,6 +180,7 @@ def delete_transaction(transaction_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/delete-bulk', methods=['POST'])
+@invalidates("transaction", "member", "book")
 def delete_transactions():
     try:
         data = request.get_json()
@@ -166,43 +189,35 @@ def delete_transactions():
         if not transaction_ids:
             return jsonify({'success': False, 'error': 'No transaction IDs provided'}), 400
 
-        deleted_count = Transaction.delete().where(Transaction.id.in_(transaction_ids)).execute()
+        with db.atomic():
+            deleted_count = sum(model.delete().where(model.id.in_(transaction_ids)).execute()
+                                for model in (Transaction, TransactionArchive))
         return jsonify({'success': True, 'deleted': deleted_count}), 200
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/return/<int:transaction_id>', methods=['POST'])
+@invalidates("transaction", "member", "book")
 def return_transaction(transaction_id):
-    transaction = Transaction.get_or_none(Transaction.id == transaction_id)
-
-    if not transaction or transaction.status != 'issued':
-        return jsonify({"success": False, "error": "Transaction not found or already returned"}), 400
-
     data = request.json
     if not data:
         return jsonify({"success": False, "error": "Invalid data"}), 400
 
-    transaction.return_date = data.get("return_date")
-    transaction.fine = data.get("fine", 0)
-    transaction.status = "returned"
-    transaction.save()
-
-    # Update the book stock
-    book = transaction.book
-    book.stock += 1
-    book.save()
-    
-    # Reduce the member's outstanding debt by the rent fee amount
-    member = transaction.member
-    if member:
-        member.outstanding_debt = max(0, member.outstanding_debt - transaction.rent_fee)
-        member.save()
-    
-    return jsonify({"success": True, "invoice_id": transaction.invoice_id})
-
-
-def get_rent():
-    with open(CONFIG_FILE, "r") as f:
-        config = json.load(f)
-    return config.get("rent_amount", 40)  # Default to 40
\ No newline at end of file
+    try:
+        return_date = datetime.strptime(data["return_date"], '%Y-%m-%d').date() if data.get("return_date") else date.today()
+    except ValueError:
+        return jsonify({"success": False, "error": "return_date must be YYYY-MM-DD"}), 400
+
+    # Late days and the fine are computed here from the settings rate; any fine sent by the client is ignored
+    try:
+        transaction = return_book(transaction_id, return_date, get_fine_rate())
+    except CirculationError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    return jsonify({
+        "success": True,
+        "invoice_id": transaction.invoice_id,
+        "late_days": transaction.late_days,
+        "fine": transaction.fine
+    })
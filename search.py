@@ -0,0 +1,96 @@
+"""Full-text catalogue search.
+
+Books are matched against ``book.search_vector`` (title, ISBN, author and
+publisher, kept current by a trigger from migrations/005_book_search_vector.py)
+through its GIN index. Every search term is matched as a prefix, so partial
+words work while typing, results are ordered by ``ts_rank_cd`` relevance, and
+each search also returns per-language and per-publisher counts for faceted
+filtering.
+
+Ranking needs every ranked row's vector from the heap, so ordering all the
+matches of a very common term by relevance costs as much as scanning them.
+Instead the GIN index picks at most ``SEARCH_CANDIDATES`` + 1 matches (in
+table order, stopping as soon as it has them), the database ranks just those,
+and they are paged, counted and faceted in Python. Below that limit (any
+reasonably specific query) every match is a candidate and results are exact;
+above it ``capped`` is set, the ranking covers the first candidates only,
+pages past them are empty and the total and facet counts are lower bounds.
+"""
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+from peewee import Column, Expression, fn
+from playhouse.postgres_ext import TS_MATCH
+from models import Book
+
+SEARCH_CONFIG = 'simple'
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 20))
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", 1000))  # Matches ranked per search
+FACET_LIMIT = 20
+
+# Not a model field, so ordinary Book queries don't fetch it
+SEARCH_VECTOR = Column(Book._meta.table, "search_vector")
+
+
+class SearchResults(NamedTuple):
+    items: List[Dict[str, Any]]
+    total: int
+    facets: Dict[str, List[Dict[str, Any]]]
+    page: int
+    page_size: int
+    capped: bool  # More than SEARCH_CANDIDATES matches; total and facets are lower bounds
+
+
+def build_tsquery(q: str) -> Optional[str]:
+    """Turn free text into a tsquery string matching every term as a prefix, or None if empty."""
+    # Split on whitespace and tsquery operators rather than \w, which would break up Devanagari words
+    terms = [term for term in re.split(r"[\s&|!():*<>'\\]+", q.lower()) if term]
+    if not terms:
+        return None
+    return " & ".join(f"'{term}':*" for term in terms)
+
+
+def matching(tsquery: str):
+    """WHERE clause selecting the books that match tsquery."""
+    return Expression(SEARCH_VECTOR, TS_MATCH, fn.to_tsquery(SEARCH_CONFIG, tsquery))
+
+
+def _facet(candidates, key) -> List[Dict[str, Any]]:
+    counts = Counter(book[key] for book in candidates)
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:FACET_LIMIT]
+    return [{'value': value, 'count': n} for value, n in ranked]
+
+
+def search_catalogue(q: str, language: Optional[str] = None, publisher: Optional[str] = None,
+                     page: int = 1, page_size: int = SEARCH_PAGE_SIZE) -> SearchResults:
+    """Rank books matching q, optionally filtered by language and publisher."""
+    page = max(1, page)
+    tsquery = build_tsquery(q)
+    if tsquery is None:
+        return SearchResults([], 0, {'language': [], 'publisher': []}, page, page_size, False)
+
+    rank = fn.ts_rank_cd(SEARCH_VECTOR, fn.to_tsquery(SEARCH_CONFIG, tsquery))
+    query = (Book
+             .select(Book.id, Book.title, Book.author, Book.isbn, Book.publisher, Book.language, Book.stock,
+                     rank.alias('rank'))
+             .where(matching(tsquery)))
+    if language:
+        query = query.where(Book.language == language)
+    if publisher:
+        query = query.where(Book.publisher == publisher)
+
+    # The LIMIT inside bounds the rows ranked; ordering them all first would visit every match
+    bounded = query.limit(SEARCH_CANDIDATES + 1).alias('candidates')
+    candidates = list(Book
+                      .select(*[bounded.c[column] for column in
+                                ('id', 'title', 'author', 'isbn', 'publisher', 'language', 'stock', 'rank')])
+                      .from_(bounded)
+                      .order_by(bounded.c.rank.desc(), bounded.c.id)
+                      .dicts())
+    capped = len(candidates) > SEARCH_CANDIDATES
+    del candidates[SEARCH_CANDIDATES:]
+
+    start = (page - 1) * page_size
+    facets = {'language': _facet(candidates, 'language'), 'publisher': _facet(candidates, 'publisher')}
+    return SearchResults(candidates[start:start + page_size], len(candidates), facets, page, page_size, capped)
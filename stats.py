@@ -0,0 +1,116 @@
+"""Library statistics for the dashboard and ``/stats``.
+
+Nothing here scans the transaction or member tables on read:
+
+* Issue and return counts per day are counters bumped inside the issue/return
+  transaction (``record_issue`` / ``record_return``). Each day is split over
+  ``STATS_SHARDS`` rows keyed by book id, so concurrent issues of different
+  books don't serialize on a single counter row.
+* Totals (titles, copies, members, open and overdue loans, outstanding debt)
+  come from the ``library_stats`` materialized view, refreshed periodically by
+  ``python stats.py`` without blocking readers. The same job refreshes the
+  list pages' filter dropdowns (``filter_option``, see listing.py).
+* Most-issued books are an indexed top-N read of ``book.times_issued``.
+
+Usage:
+    python stats.py              # refresh every STATS_REFRESH_SECONDS
+    python stats.py --once       # refresh once and exit (e.g. from cron)
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+from peewee import EXCLUDED, fn
+from config.config import db
+from models import Book, CirculationCounter
+
+STATS_SHARDS = 16
+STATS_DAYS = 30
+STATS_TOP_BOOKS = 10
+STATS_REFRESH_SECONDS = int(os.getenv("STATS_REFRESH_SECONDS", 300))
+
+
+def _bump(day, book_id, issued=0, returned=0):
+    (CirculationCounter
+     .insert(day=day, shard=int(book_id) % STATS_SHARDS, issued=issued, returned=returned)
+     .on_conflict(
+         conflict_target=[CirculationCounter.day, CirculationCounter.shard],
+         update={
+             CirculationCounter.issued: CirculationCounter.issued + EXCLUDED.issued,
+             CirculationCounter.returned: CirculationCounter.returned + EXCLUDED.returned,
+         })
+     .execute())
+
+
+def record_issue(day, book_id):
+    _bump(day, book_id, issued=1)
+
+
+def record_return(day, book_id):
+    _bump(day, book_id, returned=1)
+
+
+def refresh():
+    """Recompute the library_stats and filter_option materialized views."""
+    db.execute_sql("REFRESH MATERIALIZED VIEW CONCURRENTLY library_stats")
+    db.execute_sql("REFRESH MATERIALIZED VIEW CONCURRENTLY filter_option")
+
+
+def totals():
+    cursor = db.execute_sql("SELECT * FROM library_stats")
+    row = cursor.fetchone()
+    if row is None:
+        return {}
+    columns = [column[0] for column in cursor.description]
+    values = dict(zip(columns, row))
+    values.pop('id')
+    return values
+
+
+def circulation_per_day(days=STATS_DAYS):
+    since = date.today() - timedelta(days=days - 1)
+    query = (CirculationCounter
+             .select(CirculationCounter.day,
+                     fn.SUM(CirculationCounter.issued),
+                     fn.SUM(CirculationCounter.returned))
+             .where(CirculationCounter.day >= since)
+             .group_by(CirculationCounter.day)
+             .order_by(CirculationCounter.day))
+    return [{'day': day.isoformat(), 'issued': int(issued), 'returned': int(returned)}
+            for day, issued, returned in query.tuples()]
+
+
+def top_books(limit=STATS_TOP_BOOKS):
+    return list(Book
+                .select(Book.id, Book.title, Book.author, Book.times_issued)
+                .where(Book.times_issued > 0)
+                .order_by(Book.times_issued.desc(), Book.id)
+                .limit(limit)
+                .dicts())
+
+
+def get_stats():
+    per_day = circulation_per_day()
+    today = date.today().isoformat()
+    return {
+        **totals(),
+        'today': next((d for d in per_day if d['day'] == today), {'day': today, 'issued': 0, 'returned': 0}),
+        'per_day': per_day,
+        'top_books': top_books(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Refresh the library_stats and filter_option materialized views.")
+    parser.add_argument("--once", action="store_true", help="Refresh once and exit")
+    parser.add_argument("--every", type=int, default=STATS_REFRESH_SECONDS, help="Seconds between refreshes")
+    args = parser.parse_args()
+
+    while True:
+        started = time.perf_counter()
+        with db.connection_context():
+            refresh()
+        print(f"Stats refreshed in {time.perf_counter() - started:.2f}s")
+        if args.once:
+            break
+        time.sleep(args.every)
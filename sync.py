@@ -0,0 +1,122 @@
+"""Incremental sync: rows changed and ids deleted since a cursor.
+
+``/book/changes``, ``/member/changes`` and ``/transaction/changes`` let a
+client keep a copy of a table current without re-downloading the CSV
+exports. The first request (no cursor) pages through the whole table; every
+later one returns only what changed since the previous sync, so its cost
+follows the number of changes rather than the size of the table.
+
+Rows carry ``change_id``, the id of the transaction that last wrote them, and
+deletes leave a tombstone with the deleting transaction's id (migration 009).
+A sync pass streams rows and tombstones ordered by ``(change_id, id)`` with
+keyset paging. When it starts, it notes the oldest transaction still running
+(the snapshot xmin): everything older is committed and visible to the pass,
+so the next pass starts there. Changes committed by transactions that were
+still running are picked up by the next pass, possibly a second time. Clients
+therefore apply changes as upserts by id and deletes as idempotent.
+
+Tombstones are kept for SYNC_TOMBSTONE_DAYS; a cursor from before that gets
+410 Gone and the client syncs from scratch. Prune old tombstones daily with
+``python sync.py --prune``.
+"""
+import argparse
+import base64
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+from peewee import SQL, Tuple, Value
+from config.config import db
+from listing import get_page_size
+from models import SyncTombstone
+
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", 30))
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The cursor's state, None for a full sync. Raises ValueError if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(state, dict) or not isinstance(state.get("since"), int):
+        raise ValueError("Invalid cursor")
+    return state
+
+
+def snapshot_xmin() -> int:
+    """Id of the oldest transaction still running: every older one has committed."""
+    return db.execute_sql("SELECT txid_snapshot_xmin(txid_current_snapshot())").fetchone()[0]
+
+
+def changes(model, rows, serialize: Callable[[Any], Dict[str, Any]], args) -> Dict[str, Any]:
+    """One page of model's changes since the cursor in args.
+
+    rows is the query the changed rows are loaded with (joins and annotations
+    for serialize), page_size caps the changes plus deletes returned.
+    """
+    state = decode_cursor(args.get('cursor'))
+    if state and state.get("since_time") and state["since_time"] < time.time() - SYNC_TOMBSTONE_DAYS * 86400:
+        raise CursorExpired(f"Cursor is older than {SYNC_TOMBSTONE_DAYS} days; sync again without a cursor")
+
+    if state is None or state.get("until") is None:
+        # A new pass: from the end of the previous one (or everything) to now
+        state = {"since": state["since"] if state else 0, "since_time": state.get("since_time") if state else None,
+                 "until": snapshot_xmin(), "until_time": time.time(), "after": None}
+    page_size = get_page_size(args)
+
+    live = (model
+            .select(model.change_id.alias('change_id'), model.id.alias('row_id'), Value(False).alias('deleted'))
+            .where(model.change_id >= state["since"]))
+    dead = (SyncTombstone
+            .select(SyncTombstone.change_id, SyncTombstone.row_id, Value(True).alias('deleted'))
+            .where((SyncTombstone.table_name == model._meta.table_name) & (SyncTombstone.change_id >= state["since"])))
+    if state["after"]:
+        live = live.where(Tuple(model.change_id, model.id) > Tuple(*state["after"]))
+        dead = dead.where(Tuple(SyncTombstone.change_id, SyncTombstone.row_id) > Tuple(*state["after"]))
+    stream = list((live + dead).order_by(SQL('change_id'), SQL('row_id')).limit(page_size).tuples())
+
+    changed_ids = [row_id for _, row_id, deleted in stream if not deleted]
+    loaded = {row.id: row for row in rows.where(model.id.in_(changed_ids))} if changed_ids else {}
+    changed = [{**serialize(loaded[row_id]), 'updated_at': loaded[row_id].updated_at.isoformat()}
+               for row_id in changed_ids if row_id in loaded]  # Rows deleted since are in a later page
+    deleted = [row_id for _, row_id, is_deleted in stream if is_deleted]
+
+    has_more = len(stream) == page_size
+    if has_more:
+        state = {**state, "after": list(stream[-1][:2])}
+    else:
+        state = {"since": state["until"], "since_time": state["until_time"], "until": None, "after": None}
+    return {"success": True, "changes": changed, "deleted": deleted, "cursor": encode_cursor(state),
+            "has_more": has_more}
+
+
+def prune_tombstones(days: int = SYNC_TOMBSTONE_DAYS) -> int:
+    """Delete tombstones no unexpired cursor can still need. Returns the number deleted."""
+    return (SyncTombstone
+            .delete()
+            .where(SyncTombstone.deleted_at < SQL("now() - make_interval(days => %s)", (days,)))
+            .execute())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prune", action="store_true", help="Delete tombstones older than --days")
+    parser.add_argument("--days", type=int, default=SYNC_TOMBSTONE_DAYS)
+    args = parser.parse_args()
+
+    if args.prune:
+        with db.connection_context():
+            print(f"Pruned {prune_tombstones(args.days)} tombstone(s)")
+    else:
+        parser.print_help()
@@ -0,0 +1,80 @@
+"""Typeahead lookups for the issue-book form.
+
+Each entity has one lower-cased search text expression (members: name,
+member_id, phone and email; books: title, author and ISBN) with a matching
+pg_trgm GIN expression index (migrations/004_typeahead_trigram.py), so
+``search_text LIKE '%q%'`` is an index scan for any substring of at least
+TYPEAHEAD_MIN_CHARS characters -- a shorter pattern has no trigram to look up
+and would scan the whole table, so it is not searched at all. The top
+matches are ranked by trigram similarity and recently requested queries are
+served from a small in-process LRU, so repeated prefixes while typing don't
+reach the database.
+"""
+import os
+from typing import Any, Dict, List
+from peewee import fn
+from cache import LRUCache
+from models import Book, Member
+
+TYPEAHEAD_MIN_CHARS = 3  # Trigram length; the issue form's script waits for as many
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+
+# Short TTL: results carry stock and debt, which change on every issue/return
+_cache = LRUCache(maxsize=int(os.getenv("TYPEAHEAD_CACHE_SIZE", 2048)),
+                  ttl=float(os.getenv("TYPEAHEAD_CACHE_TTL", 10)))
+
+# Must stay identical to the indexed expressions in migration 004
+MEMBER_SEARCH_TEXT = fn.lower(Member.first_name.concat(' ').concat(Member.last_name)
+                              .concat(' ').concat(Member.member_id)
+                              .concat(' ').concat(Member.phone)
+                              .concat(' ').concat(Member.email))
+BOOK_SEARCH_TEXT = fn.lower(Book.title.concat(' ').concat(Book.author).concat(' ').concat(Book.isbn))
+
+
+def get_limit(args) -> int:
+    try:
+        limit = int(args.get('limit', TYPEAHEAD_LIMIT))
+    except (TypeError, ValueError):
+        limit = TYPEAHEAD_LIMIT
+    return max(1, min(limit, TYPEAHEAD_MAX_LIMIT))
+
+
+def _normalize(q: str) -> str:
+    return ' '.join(q.lower().split())
+
+
+def search_members(q: str, limit: int = TYPEAHEAD_LIMIT) -> List[Dict[str, Any]]:
+    text = _normalize(q)
+    if len(text) < TYPEAHEAD_MIN_CHARS:
+        return []
+
+    def query():
+        return list(Member
+                    .select(Member.id, Member.member_id, Member.first_name, Member.last_name,
+                            Member.outstanding_debt)
+                    .where(MEMBER_SEARCH_TEXT.contains(text))
+                    .order_by(fn.similarity(MEMBER_SEARCH_TEXT, text).desc(), Member.id)
+                    .limit(limit)
+                    .dicts())
+
+    return _cache.get_or_set(('member', text, limit), query)
+
+
+def search_books(q: str, limit: int = TYPEAHEAD_LIMIT, in_stock: bool = False) -> List[Dict[str, Any]]:
+    text = _normalize(q)
+    if len(text) < TYPEAHEAD_MIN_CHARS:
+        return []
+
+    def query():
+        books = (Book
+                 .select(Book.id, Book.title, Book.author, Book.isbn, Book.stock)
+                 .where(BOOK_SEARCH_TEXT.contains(text)))
+        if in_stock:
+            books = books.where(Book.stock > 0)
+        return list(books
+                    .order_by(fn.similarity(BOOK_SEARCH_TEXT, text).desc(), Book.id)
+                    .limit(limit)
+                    .dicts())
+
+    return _cache.get_or_set(('book', text, limit, in_stock), query)